@@ -1,12 +1,201 @@
-import re
-import json
-from urllib.parse import urlencode, quote
-from typing import List, Tuple
+import time
+import asyncio
+import logging
+from urllib.parse import urlencode
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-import requests
+import httpx
 
-from utils import extract_value, generate_request_id
-from settings import GOOGLE_URL
+import batchexecute
+from governor import AdaptiveLimiter, CircuitBreaker, TokenBucket, UpstreamGovernor
+from metrics import track_upstream
+from utils import extract_values, generate_request_id
+from settings import (
+    GOOGLE_URL,
+    SESSION_TOKENS_TTL,
+    UPSTREAM_HTTP2,
+    UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE,
+    UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    UPSTREAM_POOL_TIMEOUT,
+    UPSTREAM_RATE,
+    UPSTREAM_BURST,
+    UPSTREAM_CONCURRENCY_INITIAL,
+    UPSTREAM_CONCURRENCY_MIN,
+    UPSTREAM_CONCURRENCY_MAX,
+    UPSTREAM_LATENCY_TARGET,
+    UPSTREAM_RETRIES,
+    UPSTREAM_RETRY_BASE,
+    UPSTREAM_RETRY_CAP,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class UpstreamError(Exception):
+    """Raised when Google Translate returns a response that cannot be used"""
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """Raised when Google Translate is throttling or failing, worth retrying"""
+
+
+class MissingResultError(UpstreamError):
+    """Raised when a batchexecute response has no result for a requested word"""
+
+
+class UpstreamBlockedError(UpstreamUnavailableError):
+    """
+    Raised when Google Translate redirects, forbids or answers with a page
+    lacking the expected content, e.g. a captcha
+    """
+
+
+def check_response(response: httpx.Response):
+    """
+    Raises the UpstreamError matching an unsuccessful response. Only other
+    4xx responses, such as the 400 of rejected session tokens, mean that
+    upstream is healthy.
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        raise UpstreamUnavailableError(
+            f"{response.url.path} returned {response.status_code}"
+        )
+    if 300 <= response.status_code < 400 or response.status_code == 403:
+        raise UpstreamBlockedError(
+            f"{response.url.path} returned {response.status_code}"
+        )
+    if response.status_code != 200:
+        raise UpstreamError(f"{response.url.path} returned {response.status_code}")
+
+
+class SessionTokens(NamedTuple):
+    """Per-session values taken from the Google Translate page"""
+
+    rpcids: str
+    sid: str
+    bl: str
+
+
+def parse_session_tokens(page: str) -> SessionTokens:
+    """
+    Extracts the session tokens from the Google Translate page.
+
+    Raises:
+        UpstreamBlockedError: if the page has no tokens.
+    """
+    values = extract_values(page, ["MkEWBc", "FdrFJe", "cfb2h"])
+    if None in values.values():
+        raise UpstreamBlockedError("Session tokens are missing from Google Translate page")
+    return SessionTokens(rpcids=values["MkEWBc"], sid=values["FdrFJe"], bl=values["cfb2h"])
+
+
+class TokenCache:
+    """
+    Keeps the session tokens of the Google Translate page for ``ttl`` seconds,
+    so a translation only needs the batchexecute request.
+    """
+
+    def __init__(self, ttl: float = SESSION_TOKENS_TTL):
+        self.ttl = ttl
+        self._tokens: Optional[SessionTokens] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(
+        self,
+        load: Callable[[], Awaitable[SessionTokens]],
+        stale: Optional[SessionTokens] = None,
+    ) -> SessionTokens:
+        """
+        Returns cached tokens, loading them with ``load`` when they are missing
+        or expired. Passing the tokens that just failed as ``stale`` forces a
+        refresh, unless another caller has already replaced them.
+        """
+        async with self._lock:
+            if (
+                self._tokens is None
+                or self._tokens == stale
+                or time.monotonic() >= self._expires_at
+            ):
+                self._tokens = await load()
+                self._expires_at = time.monotonic() + self.ttl
+            return self._tokens
+
+    def invalidate(self):
+        """Drops the cached tokens"""
+        self._tokens = None
+
+
+session_tokens = TokenCache()
+
+upstream_governor = UpstreamGovernor(
+    bucket=TokenBucket(rate=UPSTREAM_RATE, burst=UPSTREAM_BURST),
+    limiter=AdaptiveLimiter(
+        initial=UPSTREAM_CONCURRENCY_INITIAL,
+        min_limit=UPSTREAM_CONCURRENCY_MIN,
+        max_limit=UPSTREAM_CONCURRENCY_MAX,
+        latency_target=UPSTREAM_LATENCY_TARGET,
+    ),
+    breaker=CircuitBreaker(
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+    ),
+    retries=UPSTREAM_RETRIES,
+    retry_base=UPSTREAM_RETRY_BASE,
+    retry_cap=UPSTREAM_RETRY_CAP,
+    retryable=(httpx.TransportError, UpstreamUnavailableError),
+)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled HTTP client, creating it on first use.
+
+    Connections are kept alive between requests, so a cache miss does not pay
+    for DNS, TCP and TLS setup every time.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=UPSTREAM_HTTP2,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=UPSTREAM_CONNECT_TIMEOUT,
+                read=UPSTREAM_READ_TIMEOUT,
+                write=UPSTREAM_READ_TIMEOUT,
+                pool=UPSTREAM_POOL_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Closes the pooled HTTP client and its open connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 class APIRequests:
@@ -14,31 +203,62 @@ class APIRequests:
     A translator that leverages Google Translate's API endpoint.
     """
 
-    def get_google_translate_page(self, word: str, lang: str) -> str:
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.client = client or get_client()
+
+    async def get_google_translate_page(
+        self,
+        word: str = "",
+        lang: str = "en",
+        source_lang: str = "en",
+        parse: Optional[Callable[[str], Any]] = None,
+    ) -> Any:
         """
         Fetches the Google Translate page for the given word and target language.
 
         Args:
         word (str): word or phrase to translate
         target_lang (str): language code of the target language
+        source_lang (str): language code of the word
+        parse (Callable): applied to the page while the upstream call is
+            admitted, so a page it rejects counts as an upstream failure
 
         Returns:
-        str: Google Translate page source
+        Any: Google Translate page source, or what ``parse`` returned for it
         """
-        url = f"{GOOGLE_URL}/?sl=en&tl={lang}&text={word}&op=translate"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
-        }
+        url = f"{GOOGLE_URL}/?sl={source_lang}&tl={lang}&text={word}&op=translate"
+
+        async def get_page():
+            async with upstream_governor.slot():
+                with track_upstream("page_fetch"):
+                    response = await self.client.get(url)
+                    check_response(response)
+                    page = response.content.decode("utf-8")
+                    return parse(page) if parse else page
+
+        return await upstream_governor.retry(get_page)
 
-        response = requests.get(url=url, headers=headers)
-        return response.content.decode("utf-8")
+    async def _load_session_tokens(self) -> SessionTokens:
+        """Fetches the Google Translate page and extracts its session tokens"""
+        return await self.get_google_translate_page(parse=parse_session_tokens)
 
-    def _get_batch_url(self, page: str) -> str:
-        """Extracts batch URL from page source"""
+    async def get_session_tokens(
+        self, stale: Optional[SessionTokens] = None
+    ) -> SessionTokens:
+        """
+        Returns the cached session tokens, fetching the page only when they
+        are missing, expired or ``stale`` (rejected by Google).
+        """
+        if stale is not None:
+            logging.debug("Refreshing Google Translate session tokens")
+        return await session_tokens.get(self._load_session_tokens, stale=stale)
+
+    def _get_batch_url(self, tokens: SessionTokens) -> str:
+        """Builds batch URL from session tokens"""
         data = {
-            "rpcids": extract_value(page, "MkEWBc"),
-            "f.sid": extract_value(page, "FdrFJe"),
-            "bl": extract_value(page, "cfb2h"),
+            "rpcids": tokens.rpcids,
+            "f.sid": tokens.sid,
+            "bl": tokens.bl,
             "soc-app": 1,
             "soc-platform": 1,
             "soc-device": 1,
@@ -49,58 +269,63 @@ class APIRequests:
             GOOGLE_URL + "/_/TranslateWebserverUi/data/batchexecute?" + urlencode(data)
         )
 
-    def fetch_translation(
-        self, page: str, word: str, target_lang: str
-    ) -> Tuple[str, List[Tuple[str, str]]]:
+    async def fetch_translations(
+        self,
+        tokens: SessionTokens,
+        words: Sequence[Tuple[str, str]],
+        source_lang: str = "en",
+    ) -> List[Any]:
         """
-        Fetches the raw translation object and detected language for the given word and target language.
+        Fetches raw translation objects for several words in one batchexecute request.
 
         Args:
-        page (str): Google Translate page source
-        word (str): word or phrase to translate
-        target_lang (str): language code of the target language
+        tokens (SessionTokens): Google Translate session tokens
+        words (Sequence[Tuple[str, str]]): pairs of word and target language code
+        source_lang (str): language code of the words
 
         Returns:
-        Tuple[str, List[Tuple[str, str]]]: JSON string of the raw translation object and detected language
+        List[Any]: raw translation objects in the order of ``words``, None where Google returned nothing
         """
-        batch_url = self._get_batch_url(page)
-
-        payload = (
-            "f.req="
-            + quote(
-                json.dumps(
-                    [
-                        [
-                            [
-                                "MkEWBc",
-                                json.dumps(
-                                    [[word, "en", target_lang, True], [None]],
-                                    separators=(",", ":"),
-                                ),
-                                None,
-                                "generic",
-                            ]
-                        ]
-                    ],
-                    separators=(",", ":"),
-                )
-            )
-            + "&"
-        )
-        response = requests.post(
-            batch_url,
-            data=payload,
-            headers={"content-type": "application/x-www-form-urlencoded;charset=UTF-8"},
-        )
 
-        # remove garbage prefix
-        decoded_res = response.content.decode()[6:]
-        # extract length of JSON object
-        length = re.search(r"^\d+", decoded_res)[0]
-        # extract all JSON object data
-        res_all_info = json.loads(decoded_res[len(length) : int(length) + len(length)])
+        async def fetch():
+            async with upstream_governor.slot():
+                with track_upstream("batchexecute"):
+                    response = await self.client.post(
+                        self._get_batch_url(tokens),
+                        content=batchexecute.build_payload(words, source_lang),
+                        headers={
+                            "content-type": "application/x-www-form-urlencoded;charset=UTF-8"
+                        },
+                    )
+                    check_response(response)
+                    try:
+                        frames = batchexecute.parse_response(response.text)
+                        return batchexecute.extract_results(frames, len(words))
+                    except batchexecute.MissingGuardError as e:
+                        raise UpstreamBlockedError(str(e)) from e
+                    except batchexecute.BatchExecuteError as e:
+                        raise UpstreamError(str(e)) from e
+
+        return await upstream_governor.retry(fetch)
 
-        # return raw translation object and detected language
-        translation_object = json.loads(res_all_info[0][2])
+    async def fetch_translation(
+        self, tokens: SessionTokens, word: str, target_lang: str, source_lang: str = "en"
+    ) -> Any:
+        """
+        Fetches the raw translation object for the given word and target language.
+
+        Args:
+        tokens (SessionTokens): Google Translate session tokens
+        word (str): word or phrase to translate
+        target_lang (str): language code of the target language
+        source_lang (str): language code of the word
 
+        Returns:
+        Any: raw translation object
+        """
+        [translation_object] = await self.fetch_translations(
+            tokens, [(word, target_lang)], source_lang
+        )
+        if translation_object is None:
+            raise MissingResultError(f"batchexecute returned no result for {word}")
         return translation_object
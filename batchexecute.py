@@ -0,0 +1,170 @@
+import json
+from urllib.parse import quote
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+TRANSLATE_RPC = "MkEWBc"
+RESPONSE_PREFIX = ")]}'"
+
+
+def build_payload(
+    words: Sequence[Tuple[str, str]], source_lang: str = "en"
+) -> str:
+    """
+    Builds the form-encoded ``f.req`` body of a batchexecute request with one
+    translate RPC per (word, target language) pair.
+
+    A single RPC is tagged "generic", as the web client does; batched RPCs are
+    tagged with their 1-based position so results can be matched back.
+    """
+    rpcs = [
+        [
+            TRANSLATE_RPC,
+            json.dumps(
+                [[word, source_lang, target_lang, True], [None]],
+                separators=(",", ":"),
+            ),
+            None,
+            "generic" if len(words) == 1 else str(index),
+        ]
+        for index, (word, target_lang) in enumerate(words, start=1)
+    ]
+    return "f.req=" + quote(json.dumps([rpcs], separators=(",", ":"))) + "&"
+
+
+class BatchExecuteError(ValueError):
+    """Raised when a batchexecute response cannot be decoded"""
+
+
+class MissingGuardError(BatchExecuteError):
+    """Raised when the response is not a batchexecute response at all, e.g. a captcha page"""
+
+
+class FrameDecoder:
+    """
+    Incremental decoder of a chunked (rt=c) batchexecute response.
+
+    The body starts with the ``)]}'`` guard followed by frames of the form
+    ``<length>\n<json>\n`` where length counts the characters after the digits.
+    Text is fed as it arrives and every complete frame is returned at once.
+    """
+
+    # longest length prefix accepted before the frame is considered malformed
+    MAX_LENGTH_DIGITS = 10
+
+    def __init__(self):
+        self._buffer = ""
+        self._guard_seen = False
+        self._length: Optional[int] = None
+
+    def feed(self, text: str) -> List[List[Any]]:
+        """
+        Adds received text and returns the frames it completed.
+
+        Raises:
+            BatchExecuteError: if the data is not a valid frame stream.
+        """
+        self._buffer += text
+        frames = []
+        if not self._guard_seen:
+            if len(self._buffer) < len(RESPONSE_PREFIX):
+                return frames
+            if not self._buffer.startswith(RESPONSE_PREFIX):
+                raise MissingGuardError("Missing batchexecute response guard")
+            self._buffer = self._buffer[len(RESPONSE_PREFIX) :]
+            self._guard_seen = True
+        while True:
+            if self._length is None:
+                stripped = self._buffer.lstrip()
+                digits = len(stripped) - len(stripped.lstrip("0123456789"))
+                if digits > self.MAX_LENGTH_DIGITS:
+                    raise BatchExecuteError("Invalid batchexecute frame length")
+                if digits == len(stripped):
+                    # the length may continue in the next chunk
+                    self._buffer = stripped
+                    return frames
+                if digits == 0:
+                    raise BatchExecuteError("Missing batchexecute frame length")
+                self._length = int(stripped[:digits])
+                self._buffer = stripped[digits:]
+            if len(self._buffer) < self._length:
+                return frames
+            frame_text = self._buffer[: self._length]
+            self._buffer = self._buffer[self._length :]
+            self._length = None
+            try:
+                frame = json.loads(frame_text)
+            except ValueError as e:
+                raise BatchExecuteError("Invalid batchexecute frame") from e
+            if not isinstance(frame, list):
+                raise BatchExecuteError("Unexpected batchexecute frame")
+            frames.append(frame)
+
+    def close(self):
+        """
+        Checks that the response did not end in the middle of a frame.
+
+        Raises:
+            BatchExecuteError: if the response was truncated or empty.
+        """
+        if not self._guard_seen:
+            raise MissingGuardError("Missing batchexecute response guard")
+        if self._length is not None or self._buffer.strip():
+            raise BatchExecuteError("Truncated batchexecute response")
+
+
+class ResultMatcher:
+    """
+    Matches the translate RPC results found in frames to the position of the
+    word they were requested for.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self._pending = list(range(count))
+
+    def match(self, frame: List[Any]) -> Iterator[Tuple[int, Any]]:
+        """Yields (position, decoded payload) for every translate result in the frame"""
+        for entry in frame:
+            if not isinstance(entry, list) or len(entry) < 3:
+                continue
+            if entry[0] != "wrb.fr" or entry[1] != TRANSLATE_RPC:
+                continue
+            tag = entry[6] if len(entry) > 6 else None
+            if isinstance(tag, str) and tag.isdigit() and int(tag) - 1 in self._pending:
+                index = int(tag) - 1
+            elif self._pending:
+                index = self._pending[0]
+            else:
+                continue
+            self._pending.remove(index)
+            try:
+                payload = json.loads(entry[2]) if entry[2] else None
+            except (TypeError, ValueError) as e:
+                raise BatchExecuteError("Invalid translate RPC payload") from e
+            yield index, payload
+
+
+def parse_response(body: str) -> List[List[Any]]:
+    """
+    Splits a complete chunked (rt=c) batchexecute response into its frames.
+
+    Raises:
+        BatchExecuteError: if the response is malformed or truncated.
+    """
+    decoder = FrameDecoder()
+    frames = decoder.feed(body)
+    decoder.close()
+    return frames
+
+
+def extract_results(frames: List[List[Any]], count: int) -> List[Any]:
+    """
+    Collects the decoded payloads of the translate RPCs from the frames,
+    ordered as they were requested. RPCs without a result are None.
+    """
+    results: List[Any] = [None] * count
+    matcher = ResultMatcher(count)
+    for frame in frames:
+        for index, payload in matcher.match(frame):
+            results[index] = payload
+    return results
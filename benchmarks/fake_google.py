@@ -0,0 +1,136 @@
+"""
+Local stand-in for translate.google.com used by the benchmarks.
+
+Serves a translate page holding the session tokens (padded to a realistic
+size) and answers batchexecute requests with one chunked frame per RPC, after
+an optional artificial latency. Words starting with "qwzx" have no translation.
+"""
+import json
+import asyncio
+from urllib.parse import parse_qs
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from batchexecute import RESPONSE_PREFIX
+
+
+def sample_translation(word: str, lang: str) -> list:
+    """Raw translation object shaped like the MkEWBc response of Google"""
+    return [
+        [word, None, None, None, None, None, [word, "en", lang, True]],
+        [[[None, None, None, None, None, [[f"{word}-{lang}"]]]], lang, 1, "en"],
+        "en",
+        [
+            word,
+            [
+                [
+                    [
+                        "noun",
+                        [
+                            [
+                                f"a procedure intended to establish the quality of {word}.",
+                                f"no sparking was visible during the {word}",
+                                True,
+                                None,
+                                None,
+                                [[[["trial"], ["experiment"], ["check"]]]],
+                            ],
+                            [f"a movable hearth used for {word}.", None, None, None, [["Metallurgy"]]],
+                        ],
+                        None,
+                        1,
+                    ],
+                    ["verb", [[f"take measures to check {word}.", None, True]], None, 2],
+                ],
+                7,
+                True,
+            ],
+            [
+                [
+                    [None, f"such behavior would severely <b>{word}</b> any marriage"],
+                    [None, f"a statutory <b>{word}</b> of obscenity"],
+                    [None, f"researchers developed a <b>{word}</b> for the virus"],
+                ],
+                3,
+                3,
+            ],
+            None,
+            None,
+            [
+                [
+                    [
+                        "noun",
+                        [
+                            [f"{word}-{lang}", None, [f"{word}-{lang}-1", f"{word}-{lang}-2"], 1, True],
+                            [f"{word}-{lang}-alt", None, [f"{word}-{lang}-1"], 2, True],
+                        ],
+                        lang,
+                        "en",
+                    ]
+                ]
+            ],
+            word,
+            None,
+            lang,
+            1,
+        ],
+    ]
+
+
+def frame(entries: list) -> str:
+    """Encodes one length-prefixed rt=c frame"""
+    data = json.dumps(entries)
+    return f"{len(data) + 1}\n{data}\n"
+
+
+def create_app(latency: float = 0.0, page_size: int = 1024 * 1024) -> Starlette:
+    """
+    Creates the fake Google Translate application.
+
+    Args:
+        latency: seconds to wait before answering every request.
+        page_size: size of the translate page in bytes.
+    """
+    tokens = '"MkEWBc":"MkEWBc","FdrFJe":"-1234567890","cfb2h":"boq_translate-webserver_bench"'
+    # the tokens sit near the end of the page, as they do on the real one
+    page = "<html>".ljust(page_size, " ") + "<script>" + tokens + "</script></html>"
+    stats = {"pages": 0, "batches": 0, "rpcs": 0}
+
+    async def translate_page(request: Request):
+        stats["pages"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return Response(page, media_type="text/html")
+
+    async def batchexecute(request: Request):
+        stats["batches"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        form = parse_qs((await request.body()).decode())
+        [rpcs] = json.loads(form["f.req"][0])
+        body = RESPONSE_PREFIX + "\n\n"
+        for rpc_id, arguments, _, tag in rpcs:
+            stats["rpcs"] += 1
+            [[word, _, target_lang, _], _] = json.loads(arguments)
+            payload = (
+                [[None, None, "en"]]
+                if word.startswith("qwzx")
+                else sample_translation(word, target_lang)
+            )
+            body += frame(
+                [["wrb.fr", rpc_id, json.dumps(payload), None, None, None, tag]]
+            )
+        body += frame([["di", 42], ["af.httprm", 41, "-1", 7]])
+        return Response(body, media_type="application/json; charset=utf-8")
+
+    app = Starlette(
+        routes=[
+            Route("/", translate_page),
+            Route("/_/TranslateWebserverUi/data/batchexecute", batchexecute, methods=["POST"]),
+        ]
+    )
+    app.state.stats = stats
+    return app
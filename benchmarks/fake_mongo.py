@@ -0,0 +1,413 @@
+"""
+In-memory stand-in for the Motor collections used by the service.
+
+Implements the subset of the Motor API and query language the application
+relies on (equality, $in, $gt, $regex, $all, $exists, projections, sorting,
+unique indexes, upserts and bulk writes), so the benchmarks can run without a
+database server. Lookups on a unique index are served from a dictionary, as a
+real index would.
+"""
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+_MISSING = object()
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value: Any, op: str, argument: Any) -> bool:
+    if op == "$in":
+        return any(_equals(value, item) for item in argument)
+    if op == "$nin":
+        return not any(_equals(value, item) for item in argument)
+    if op == "$ne":
+        return not _equals(value, argument)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(argument)
+    if op == "$all":
+        return all(_equals(value, item) for item in argument)
+    if op == "$regex":
+        values = value if isinstance(value, list) else [value]
+        return any(isinstance(v, str) and re.search(argument, v) for v in values)
+    if value is _MISSING or value is None or type(value) is not type(argument):
+        return False
+    if op == "$gt":
+        return value > argument
+    if op == "$gte":
+        return value >= argument
+    if op == "$lt":
+        return value < argument
+    if op == "$lte":
+        return value <= argument
+    raise NotImplementedError(op)
+
+
+def _get(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Checks whether the document matches the Mongo filter"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+            continue
+        value = _get(document, key)
+        if isinstance(condition, dict) and condition and all(
+            op.startswith("$") for op in condition
+        ):
+            if not all(_compare(value, op, arg) for op, arg in condition.items()):
+                return False
+        elif not _equals(value, condition):
+            return False
+    return True
+
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Applies an inclusion or exclusion projection to a copy of the document"""
+    if not projection:
+        return dict(document)
+    included = [key for key, value in projection.items() if value and key != "_id"]
+    if included:
+        result = {key: document[key] for key in included if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result = {"_id": document["_id"], **result}
+        return result
+    return {key: value for key, value in document.items() if key not in projection}
+
+
+def _index_fields(keys) -> Tuple[str, ...]:
+    if isinstance(keys, str):
+        return (keys,)
+    return tuple(key for key, _ in keys)
+
+
+class FakeCursor:
+    """Lazily evaluated cursor supporting sort, skip, limit and async iteration"""
+
+    def __init__(self, collection: "FakeCollection", query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Dict[str, Any]]] = None
+
+    def sort(self, key, direction: int = 1):
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _evaluate(self) -> List[Dict[str, Any]]:
+        if self._results is None:
+            documents = self._collection._select(self._query)
+            for key, direction in reversed(self._sort):
+                documents.sort(
+                    key=lambda doc: (_get(doc, key) is _MISSING, str(_get(doc, key))),
+                    reverse=direction < 0,
+                )
+            documents = documents[self._skip :]
+            if self._limit:
+                documents = documents[: self._limit]
+            self._results = [project(doc, self._projection) for doc in documents]
+        return self._results
+
+    async def to_list(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        results = self._evaluate()
+        length = length or len(results)
+        batch, self._results = results[:length], results[length:]
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        results = self._evaluate()
+        if not results:
+            raise StopAsyncIteration
+        return results.pop(0)
+
+
+class FakeCollection:
+    """In-memory collection with the async methods of a Motor collection"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._documents: Dict[Any, Dict[str, Any]] = {}
+        # unique index fields -> {field values: _id}
+        self._unique: Dict[Tuple[str, ...], Dict[Tuple, Any]] = {}
+        self.indexes: List[Tuple[str, ...]] = []
+
+    # indexes
+
+    async def create_index(self, keys, unique: bool = False, **kwargs) -> str:
+        fields = _index_fields(keys)
+        if fields not in self.indexes:
+            self.indexes.append(fields)
+        if unique and fields not in self._unique:
+            entries = {}
+            for _id, document in self._documents.items():
+                key = self._key(fields, document)
+                if key in entries:
+                    raise DuplicateKeyError(f"duplicate key {key}", 11000)
+                entries[key] = _id
+            self._unique[fields] = entries
+        return "_".join(f"{field}_1" for field in fields)
+
+    async def drop_index(self, keys):
+        fields = _index_fields(keys)
+        if fields in self.indexes:
+            self.indexes.remove(fields)
+        self._unique.pop(fields, None)
+
+    # reads
+
+    def _key(self, fields: Tuple[str, ...], document: Dict[str, Any]) -> Tuple:
+        return tuple(document.get(field) for field in fields)
+
+    def _select(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if "_id" in query and not isinstance(query["_id"], dict):
+            document = self._documents.get(query["_id"])
+            return [document] if document and matches(document, query) else []
+        for fields, entries in self._unique.items():
+            if set(fields) <= set(query) and all(
+                not isinstance(query[field], dict) for field in fields
+            ):
+                _id = entries.get(tuple(query[field] for field in fields))
+                document = self._documents.get(_id)
+                return [document] if document and matches(document, query) else []
+        return [doc for doc in self._documents.values() if matches(doc, query)]
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection=None, **kwargs):
+        return FakeCursor(self, query or {}, projection)
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection=None, **kwargs):
+        documents = self._select(query or {})
+        return project(documents[0], projection) if documents else None
+
+    async def count_documents(self, query: Dict[str, Any], **kwargs) -> int:
+        return len(self._select(query))
+
+    async def distinct(self, key: str, query: Optional[Dict[str, Any]] = None) -> List[Any]:
+        values = []
+        for document in self._select(query or {}):
+            value = _get(document, key)
+            if value is not _MISSING and value not in values:
+                values.append(value)
+        return values
+
+    # writes
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError("duplicate _id", 11000)
+        for fields, entries in self._unique.items():
+            if self._key(fields, document) in entries:
+                raise DuplicateKeyError(f"duplicate key {self._key(fields, document)}", 11000)
+        for fields, entries in self._unique.items():
+            entries[self._key(fields, document)] = document["_id"]
+        self._documents[document["_id"]] = dict(document)
+        return document["_id"]
+
+    def _remove(self, document: Dict[str, Any]):
+        del self._documents[document["_id"]]
+        for fields, entries in self._unique.items():
+            entries.pop(self._key(fields, document), None)
+
+    def _apply(self, document: Dict[str, Any], update: Dict[str, Any], inserting: bool):
+        stored = self._documents.get(document.get("_id")) is document
+        if stored:
+            for fields, entries in self._unique.items():
+                entries.pop(self._key(fields, document), None)
+        for op, values in update.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                document.update(values)
+            elif op == "$inc":
+                for key, amount in values.items():
+                    document[key] = document.get(key, 0) + amount
+            elif op == "$unset":
+                for key in values:
+                    document.pop(key, None)
+            elif op != "$setOnInsert":
+                raise NotImplementedError(op)
+        if stored:
+            for fields, entries in self._unique.items():
+                entries[self._key(fields, document)] = document["_id"]
+
+    def _upsert(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        document = {
+            key: value
+            for key, value in query.items()
+            if not key.startswith("$") and not isinstance(value, dict)
+        }
+        document.setdefault("_id", update.get("$setOnInsert", {}).get("_id", ObjectId()))
+        self._apply(document, update, inserting=True)
+        return self._insert(document)
+
+    async def insert_one(self, document: Dict[str, Any]):
+        return SimpleNamespace(inserted_id=self._insert(document))
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        inserted_ids, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted_ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {"writeErrors": errors, "nInserted": len(inserted_ids)}
+            )
+        return SimpleNamespace(inserted_ids=inserted_ids)
+
+    async def update_one(self, query, update, upsert: bool = False):
+        documents = self._select(query)
+        if documents:
+            self._apply(documents[0], update, inserting=False)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        upserted_id = self._upsert(query, update) if upsert else None
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=upserted_id)
+
+    async def update_many(self, query, update, upsert: bool = False):
+        documents = self._select(query)
+        for document in documents:
+            self._apply(document, update, inserting=False)
+        return SimpleNamespace(matched_count=len(documents), modified_count=len(documents))
+
+    async def find_one_and_update(
+        self,
+        query,
+        update,
+        upsert: bool = False,
+        projection=None,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs,
+    ):
+        documents = self._select(query)
+        if documents:
+            before = project(documents[0], projection)
+            self._apply(documents[0], update, inserting=False)
+            return before if return_document == ReturnDocument.BEFORE else project(documents[0], projection)
+        if not upsert:
+            return None
+        _id = self._upsert(query, update)
+        return None if return_document == ReturnDocument.BEFORE else project(self._documents[_id], projection)
+
+    async def find_one_and_delete(self, query, projection=None, **kwargs):
+        documents = self._select(query)
+        if not documents:
+            return None
+        self._remove(documents[0])
+        return project(documents[0], projection)
+
+    async def delete_one(self, query):
+        documents = self._select(query)
+        if documents:
+            self._remove(documents[0])
+        return SimpleNamespace(deleted_count=len(documents[:1]))
+
+    async def delete_many(self, query):
+        documents = self._select(query)
+        for document in documents:
+            self._remove(document)
+        return SimpleNamespace(deleted_count=len(documents))
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        counts = dict.fromkeys(("inserted", "matched", "upserted", "deleted"), 0)
+        for request in requests:
+            if isinstance(request, InsertOne):
+                await self.insert_one(request._doc)
+                counts["inserted"] += 1
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                method = self.update_one if isinstance(request, UpdateOne) else self.update_many
+                result = await method(request._filter, request._doc, upsert=bool(request._upsert))
+                counts["matched"] += result.matched_count
+                counts["upserted"] += int(getattr(result, "upserted_id", None) is not None)
+            elif isinstance(request, (DeleteOne, DeleteMany)):
+                method = self.delete_one if isinstance(request, DeleteOne) else self.delete_many
+                counts["deleted"] += (await method(request._filter)).deleted_count
+            else:
+                raise NotImplementedError(type(request).__name__)
+        return SimpleNamespace(
+            inserted_count=counts["inserted"],
+            matched_count=counts["matched"],
+            modified_count=counts["matched"],
+            upserted_count=counts["upserted"],
+            deleted_count=counts["deleted"],
+        )
+
+
+class FakeDatabase:
+    """Database handing out collections by attribute or item access"""
+
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class FakeClient:
+    """Stand-in for AsyncIOMotorClient"""
+
+    def __init__(self):
+        self._databases: Dict[str, FakeDatabase] = {}
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return self._databases.setdefault(name, FakeDatabase())
+
+    def __getattr__(self, name: str) -> FakeDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def server_info(self) -> Dict[str, Any]:
+        return {"version": "fake"}
+
+    @property
+    def admin(self):
+        return SimpleNamespace(command=self._command)
+
+    async def _command(self, *args, **kwargs):
+        return {"ok": 1}
+
+    def close(self):
+        pass
@@ -0,0 +1,261 @@
+"""
+Load-test and micro-benchmark suite.
+
+Runs the real application in-process against a fake Google Translate server
+(benchmarks/fake_google.py) and an in-memory Mongo (benchmarks/fake_mongo.py,
+or a real server with --mongo-url), then reports latency percentiles and
+requests per second for miss, hit, search and delete traffic, followed by
+micro-benchmarks of the parsing helpers.
+
+    python -m benchmarks.run --requests 2000 --concurrency 50 --output bench.json
+    python -m benchmarks.run --compare bench.json
+
+The JSON written with --output can be compared between versions with --compare.
+"""
+import sys
+import json
+import time
+import random
+import timeit
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+import httpx
+
+import api_requests
+import batchexecute
+import main
+from benchmarks.fake_google import create_app, sample_translation
+from benchmarks.fake_mongo import FakeClient
+from serialization import word_document
+from translate_handler import TranslateHandler
+from utils import extract_value, extract_values
+
+Request = Tuple[str, str, Optional[Any]]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(latencies: List[float], elapsed: float, statuses: Counter) -> Dict[str, Any]:
+    """Latency percentiles in milliseconds, throughput and status codes of a run"""
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def drive(client: httpx.AsyncClient, requests: List[Request], concurrency: int) -> Dict[str, Any]:
+    """Sends the requests with ``concurrency`` workers and summarizes the run"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    pending = iter(requests)
+
+    async def worker():
+        for method, url, body in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, statuses)
+
+
+def build_traffic(count: int, lang: str, seed: int) -> Dict[str, List[Request]]:
+    """Requests of every scenario; misses create the words the others use"""
+    rng = random.Random(seed)
+    words = [f"bench{i}" for i in range(count)]
+    hot = words[: max(1, min(len(words), 100))]
+    substrings = [
+        word[start : start + length]
+        for word in words
+        for start, length in [(rng.randrange(len(word)), rng.randint(1, 5))]
+    ]
+    return {
+        "miss": [("POST", "/translate_word", {"word": word, "lang": lang}) for word in words],
+        "hit": [
+            ("POST", "/translate_word", {"word": rng.choice(hot), "lang": lang})
+            for _ in range(count)
+        ],
+        "search": [("GET", f"/{substring}", None) for substring in substrings],
+        "delete": [("DELETE", f"/{word}", None) for word in words],
+    }
+
+
+async def load_test(options: argparse.Namespace) -> Dict[str, Any]:
+    """Runs every traffic scenario against the application"""
+    google = create_app(latency=options.google_latency / 1000, page_size=options.page_size)
+    api_requests._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=google))
+    api_requests.upstream_governor.bucket.rate = options.upstream_rate
+
+    if options.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        mongo_client = AsyncIOMotorClient(options.mongo_url)
+    else:
+        mongo_client = FakeClient()
+
+    traffic = build_traffic(options.requests, options.lang, options.seed)
+    results = {}
+    with patch("main.create_client", return_value=mongo_client), patch(
+        "database.MONGO_DATABASE", options.mongo_db
+    ), patch("main.LOG_FILE", options.log_file), patch("main.LOG_LEVEL", options.log_level):
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=main.app), base_url="http://bench"
+            ) as client:
+                for scenario in options.scenarios:
+                    results[scenario] = await drive(
+                        client, traffic[scenario], options.concurrency
+                    )
+                    print(f"{scenario:>8}: {results[scenario]}", file=sys.stderr)
+        if options.mongo_url:
+            await mongo_client.drop_database(options.mongo_db)
+    results["upstream"] = dict(google.state.stats)
+    return results
+
+
+def micro_benchmarks(repeat: int) -> Dict[str, float]:
+    """Best time per call in microseconds of the parsing helpers"""
+    handler = TranslateHandler()
+    raw_object = sample_translation("test", "de")
+    page = "<html>".ljust(1024 * 1024) + '"MkEWBc":"a","FdrFJe":"b","cfb2h":"c"'
+    payload = json.dumps([["wrb.fr", "MkEWBc", json.dumps(raw_object), None, None, None, "generic"]])
+    body = batchexecute.RESPONSE_PREFIX + f"\n\n{len(payload) + 1}\n{payload}\n"
+    word = handler.build_word_model(word="test", lang="de", raw_object=raw_object)
+    document = word_document(word)
+    cases: Dict[str, Callable[[], Any]] = {
+        "set_detailed_translations": lambda: handler.set_detailed_translations(raw_object),
+        "set_definitions": lambda: handler.set_definitions(raw_object),
+        "set_examples": lambda: handler.set_examples(raw_object),
+        "build_word_model": lambda: handler.build_word_model("test", "de", raw_object),
+        "extract_value": lambda: extract_value(page, "cfb2h"),
+        "extract_values": lambda: extract_values(page, ["MkEWBc", "FdrFJe", "cfb2h"]),
+        "parse_batchexecute": lambda: batchexecute.extract_results(
+            batchexecute.parse_response(body), 1
+        ),
+        "render_word": lambda: main.render_word(document),
+    }
+    results = {}
+    for name, fn in cases.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = round(best * 1e6, 3)
+        print(f"{name:>26}: {results[name]} us", file=sys.stderr)
+    return results
+
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Lines describing the change of every metric relative to the baseline"""
+    lines = []
+
+    def change(old, new):
+        return f"{old} -> {new} ({(new - old) / old * 100:+.1f}%)" if old else f"{old} -> {new}"
+
+    for scenario, result in current.get("scenarios", {}).items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old or "rps" not in result:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            lines.append(f"{scenario}.{metric}: {change(old[metric], result[metric])}")
+    for name, value in current.get("micro", {}).items():
+        if name in baseline.get("micro", {}):
+            lines.append(f"micro.{name}_us: {change(baseline['micro'][name], value)}")
+    return lines
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the translator service")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["miss", "hit", "search", "delete"],
+        choices=["miss", "hit", "search", "delete"],
+        help="traffic to run, in order; hit, search and delete use the words created by miss",
+    )
+    parser.add_argument("--lang", default="de", help="target language of the traffic")
+    parser.add_argument(
+        "--google-latency", type=float, default=50, help="fake Google latency in ms"
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=1024 * 1024, help="fake translate page size in bytes"
+    )
+    parser.add_argument(
+        "--upstream-rate",
+        type=float,
+        default=0,
+        help="upstream rate limit in requests/s, 0 disables it",
+    )
+    parser.add_argument("--mongo-url", help="use a real Mongo server instead of the in-memory one")
+    parser.add_argument("--mongo-db", default="translator_bench", help="database used with --mongo-url")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the traffic")
+    parser.add_argument("--micro-repeat", type=int, default=5, help="repeats of micro-benchmarks")
+    parser.add_argument("--skip-load", action="store_true", help="only run micro-benchmarks")
+    parser.add_argument("--skip-micro", action="store_true", help="only run the load test")
+    parser.add_argument("--log-file", help="write the service logs to this file instead of stderr")
+    parser.add_argument(
+        "--log-level", default="WARNING", help="level of the service logs, WARNING by default"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    return parser.parse_args(argv)
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Runs the benchmarks and returns the machine-readable results"""
+    results: Dict[str, Any] = {
+        "revision": revision(),
+        "config": {
+            key: value
+            for key, value in vars(options).items()
+            if key not in ("output", "compare", "log_file")
+        },
+    }
+    if not options.skip_load:
+        results["scenarios"] = asyncio.run(load_test(options))
+    if not options.skip_micro:
+        results["micro"] = micro_benchmarks(options.micro_repeat)
+    return results
+
+
+if __name__ == "__main__":
+    options = parse_args()
+    results = run(options)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if options.compare:
+        with open(options.compare) as f:
+            print("\n".join(compare(json.load(f), results)), file=sys.stderr)
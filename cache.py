@@ -0,0 +1,163 @@
+import time
+import datetime
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+Key = Tuple[str, Optional[str]]
+
+
+class WordCache:
+    """
+    In-process LRU cache of ready-to-send word responses keyed by (name, lang).
+
+    The cache is bounded both by the number of entries and by the total size of
+    the stored bodies; entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, ttl: float):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Key, Tuple[float, bytes]]" = OrderedDict()
+        self._langs: Dict[str, Set[Optional[str]]] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, name: str, lang: Optional[str]) -> Optional[bytes]:
+        """Returns the cached body for the word or None"""
+        key = (name, lang)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, body = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def set(self, name: str, lang: Optional[str], body: bytes):
+        """Stores the body for the word, evicting least recently used entries"""
+        if len(body) > self.max_bytes or self.max_items <= 0:
+            return
+        key = (name, lang)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, body)
+        self._langs.setdefault(name, set()).add(lang)
+        self.size += len(body)
+        while len(self._entries) > self.max_items or self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, name: str, lang: Optional[str] = None):
+        """Removes the word in the given language, or in every language"""
+        langs = [lang] if lang is not None else list(self._langs.get(name, ()))
+        for cached_lang in langs:
+            if (name, cached_lang) in self._entries:
+                self._remove((name, cached_lang))
+
+    def clear(self):
+        """Removes every entry, keeping the counters"""
+        self._entries.clear()
+        self._langs.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Returns size and hit/miss/eviction counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Key):
+        _, body = self._entries.pop(key)
+        self.size -= len(body)
+        langs = self._langs[key[0]]
+        langs.discard(key[1])
+        if not langs:
+            del self._langs[key[0]]
+
+
+class NegativeCache:
+    """
+    Remembers (name, lang) pairs Google has no translation for, so retries of
+    misspelled or junk words do not reach Google again until ``ttl`` expires.
+
+    Entries live in a bounded in-process map and, when a collection is set,
+    also in Mongo where a TTL index expires them, so they are shared by workers.
+    """
+
+    def __init__(self, max_items: int, ttl: float, collection=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.collection = collection
+        self._entries: "OrderedDict[Key, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.mongo_hits = 0
+
+    async def contains(self, name: str, lang: Optional[str]) -> bool:
+        """Checks whether the word is known to have no translation"""
+        key = (name, lang)
+        expires_at = self._entries.get(key)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            del self._entries[key]
+        if self.collection is not None and await self.collection.find_one(
+            {"name": name, "lang": lang}, {"_id": 1}
+        ):
+            self._remember(key)
+            self.hits += 1
+            self.mongo_hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    async def add(self, name: str, lang: Optional[str]):
+        """Records that the word has no translation"""
+        self._remember((name, lang))
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"name": name, "lang": lang},
+                {"$set": {"created_at": datetime.datetime.utcnow()}},
+                upsert=True,
+            )
+
+    def clear(self):
+        """Removes every in-process entry, keeping the counters"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns size and hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._entries),
+            "hits": self.hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: Key):
+        self._entries[key] = time.monotonic() + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
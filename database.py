@@ -0,0 +1,202 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from settings import (
+    MONGO_DETAILS,
+    MONGO_DATABASE,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+
+
+def create_client() -> AsyncIOMotorClient:
+    """Creates the Motor client with the configured connection pool"""
+    return AsyncIOMotorClient(
+        MONGO_DETAILS,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    )
+
+
+def get_words_collection(client: AsyncIOMotorClient) -> AsyncIOMotorCollection:
+    """Returns the collection the translated words are stored in"""
+    return client[MONGO_DATABASE].words
+
+
+def get_missing_words_collection(
+    client: AsyncIOMotorClient,
+) -> AsyncIOMotorCollection:
+    """Returns the collection of words Google has no translation for"""
+    return client[MONGO_DATABASE].missing_words
+
+
+# fields used only for indexing and access counting that are never sent to clients
+WORD_PROJECTION = {"grams": 0, "hits": 0, "last_hit_at": 0}
+# fields clients may select with a projection
+WORD_FIELDS = ("name", "lang", "definitions", "synonyms", "translations", "examples")
+
+
+def build_projection(fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Builds a Mongo projection returning only the given public fields.
+
+    Raises:
+        ValueError: if a field is not one of WORD_FIELDS.
+    """
+    projection = {}
+    for field in fields:
+        if field not in WORD_FIELDS:
+            raise ValueError(f"Unknown field {field}")
+        projection[field] = 1
+    return projection or WORD_PROJECTION
+
+
+# Mongo error codes
+INDEX_NOT_FOUND = 27
+DUPLICATE_KEY = 11000
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+WORD_KEY = [("name", ASCENDING), ("lang", ASCENDING)]
+# most requested words first, the most recently fetched among equally requested ones
+POPULARITY_KEY = [("hits", DESCENDING), ("fetched_at", DESCENDING)]
+
+
+async def ensure_indexes(collection: AsyncIOMotorCollection):
+    """
+    Creates the indexes used by lookups and searches on the words collection.
+
+    (name, lang) is unique. A non-unique index left by an older version or
+    duplicated words are only reported, migrate_word_index replaces them from
+    a one-off command rather than from every starting worker.
+    POPULARITY_KEY orders the most requested words and fetched_at finds the
+    words stored since the last suggest index sync.
+    """
+    try:
+        await collection.create_index(WORD_KEY, unique=True)
+    except OperationFailure as e:
+        if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT, DUPLICATE_KEY):
+            raise
+        logging.warning(
+            "The (name, lang) index is not unique, run python migrate.py: %s", e
+        )
+    await collection.create_index("grams")
+    await collection.create_index(POPULARITY_KEY)
+    await collection.create_index("fetched_at")
+
+
+async def migrate_word_index(collection: AsyncIOMotorCollection) -> int:
+    """
+    Replaces a non-unique (name, lang) index with the unique one, removing
+    duplicated words first when needed.
+
+    Returns:
+        The number of removed documents.
+    """
+    removed = 0
+    try:
+        await collection.create_index(WORD_KEY, unique=True)
+        return removed
+    except OperationFailure as e:
+        if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT, DUPLICATE_KEY):
+            raise
+    try:
+        logging.warning("Dropping the non-unique (name, lang) index")
+        await collection.drop_index(WORD_KEY)
+    except OperationFailure as e:
+        # already dropped by a concurrent migration
+        if e.code != INDEX_NOT_FOUND:
+            raise
+    try:
+        await collection.create_index(WORD_KEY, unique=True)
+    except OperationFailure as e:
+        if e.code != DUPLICATE_KEY:
+            raise
+        removed = await remove_duplicates(collection)
+        await collection.create_index(WORD_KEY, unique=True)
+    return removed
+
+
+async def ensure_missing_words_indexes(collection: AsyncIOMotorCollection, ttl: float):
+    """Creates the lookup index and the TTL index expiring missing words"""
+    await collection.create_index(WORD_KEY, unique=True)
+    try:
+        await collection.create_index("created_at", expireAfterSeconds=int(ttl))
+    except OperationFailure as e:
+        if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+            raise
+        # the TTL changed since the index was created
+        await collection.drop_index([("created_at", ASCENDING)])
+        await collection.create_index("created_at", expireAfterSeconds=int(ttl))
+
+
+async def remove_duplicates(collection: AsyncIOMotorCollection) -> int:
+    """
+    Keeps a single document per (name, lang).
+
+    Returns:
+        The number of removed documents.
+    """
+    duplicates = collection.aggregate(
+        [
+            {"$group": {"_id": {"name": "$name", "lang": "$lang"}, "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ],
+        allowDiskUse=True,
+    )
+    removed = 0
+    async for group in duplicates:
+        logging.warning(
+            "Removing duplicates of (%s, %s): %s",
+            group["_id"]["name"],
+            group["_id"].get("lang"),
+            group["ids"][1:],
+        )
+        result = await collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+
+async def insert_word(
+    collection: AsyncIOMotorCollection, document: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Inserts the word document unless the word is already stored, in a single round trip.
+
+    Returns:
+        The stored document if the word already existed, None if it was inserted.
+    """
+    key = {"name": document["name"], "lang": document["lang"]}
+    try:
+        return await collection.find_one_and_update(
+            key, {"$setOnInsert": document}, upsert=True, projection=WORD_PROJECTION
+        )
+    except DuplicateKeyError:
+        # a concurrent upsert of the same word won the race
+        return await collection.find_one(key, WORD_PROJECTION)
+
+
+async def insert_words(
+    collection: AsyncIOMotorCollection, documents: List[Dict[str, Any]]
+) -> int:
+    """
+    Inserts word documents, skipping the words that are already stored.
+
+    Returns:
+        The number of inserted documents.
+    """
+    try:
+        result = await collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
@@ -0,0 +1,231 @@
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing ``rate`` calls per second on average and bursts of
+    up to ``burst`` calls. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    async def acquire(self):
+        """Waits until a call is allowed"""
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted with AIMD: every fast successful call raises
+    the limit by 1/limit (about +1 per round trip), a failure or a call slower
+    than ``latency_target`` multiplies it by ``backoff``.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        backoff: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Waits for a free slot under the current limit"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, ok: bool):
+        """Frees the slot and adjusts the limit from the call outcome"""
+        async with self._condition:
+            self.in_flight -= 1
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_timeout`` seconds. Then a single trial call is let through
+    (half-open): its success closes the breaker, its failure opens it again.
+    Outcomes of calls admitted before the breaker opened are ignored.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def check(self) -> bool:
+        """
+        Returns:
+            True if the call is the trial of the half-open breaker.
+
+        Raises:
+            CircuitOpenError: if the call must not be made.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError("Upstream is unhealthy")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial_running:
+                self.rejected += 1
+                raise CircuitOpenError("Upstream is being probed")
+            self._trial_running = True
+            return True
+        return False
+
+    def abandon(self):
+        """Lets another call be the trial when the trial was never made"""
+        self._trial_running = False
+
+    def record(self, ok: bool, trial: bool = False):
+        """Records the outcome of an allowed call"""
+        if trial:
+            self._trial_running = False
+        elif self.state != self.CLOSED:
+            # the call was admitted before the breaker opened, only the trial decides
+            return
+        if ok:
+            self.failures = 0
+            self.state = self.CLOSED
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class UpstreamGovernor:
+    """
+    Guards calls to an upstream service with a circuit breaker, a token bucket
+    rate limit, an adaptive concurrency limit and jittered retries.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        limiter: AdaptiveLimiter,
+        breaker: CircuitBreaker,
+        retries: int,
+        retry_base: float,
+        retry_cap: float,
+        retryable: Tuple[Type[BaseException], ...],
+    ):
+        self.bucket = bucket
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.retryable = retryable
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Admits one upstream call: fails fast while the breaker is open, then
+        waits for the rate limit and a concurrency slot. The outcome and
+        latency of the block feed the breaker and the adaptive limit; only
+        ``retryable`` errors and cancellations count as upstream failures,
+        other errors mean upstream answered, e.g. rejected stale tokens.
+        """
+        trial = self.breaker.check()
+        try:
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+        except BaseException:
+            # cancelled while waiting, the trial was never made
+            if trial:
+                self.breaker.abandon()
+            raise
+        self.calls += 1
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        except self.retryable:
+            raise
+        except Exception:
+            self.errors += 1
+            ok = True
+            raise
+        finally:
+            if not ok:
+                self.errors += 1
+            self.breaker.record(ok, trial)
+            await self.limiter.release(time.monotonic() - started, ok)
+
+    async def retry(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Calls ``fn`` again after retryable errors, at most ``retries`` times,
+        sleeping a random "full jitter" delay bounded by an exponential backoff.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await fn()
+            except self.retryable:
+                if attempt == self.retries:
+                    raise
+                self.retried += 1
+                delay = min(self.retry_cap, self.retry_base * 2**attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns call counters and the state of the limits"""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retried": self.retried,
+            "rejected": self.breaker.rejected,
+            "breaker": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
@@ -0,0 +1,181 @@
+import json
+import queue
+import random
+import logging
+import logging.handlers
+import datetime
+import contextvars
+import uuid
+from typing import Optional
+
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attaches the ID of the request being handled to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a ``rate`` fraction of the records below ``level``"""
+
+    def __init__(self, rate: float, level: int = logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the caller: records that do not fit in the
+    bounded queue are counted and dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only the message is merged here, the writer thread does the formatting
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    level: str = "INFO",
+    path: Optional[str] = None,
+    format: str = "json",
+    sample_rate: float = 1.0,
+    queue_size: int = 10000,
+) -> DroppingQueueHandler:
+    """
+    Routes the root logger through a bounded queue to a background writer.
+
+    Records below ``level`` are rejected before their arguments are formatted,
+    DEBUG records are sampled with ``sample_rate``. The writer appends to
+    ``path`` or to stderr, as JSON lines or as plain text.
+
+    Calling it again replaces the previous setup.
+    """
+    global _listener, _handler
+    stop_logging()
+    if path:
+        target: logging.Handler = logging.FileHandler(path, encoding="utf-8")
+    else:
+        target = logging.StreamHandler()
+    if format == "json":
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(
+            logging.Formatter(
+                "%(asctime)s %(levelname)-8s %(name)-17s %(request_id)s %(message)s"
+            )
+        )
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    if sample_rate < 1:
+        _handler.addFilter(SamplingFilter(sample_rate))
+    _handler.addFilter(RequestIdFilter())
+    _listener = logging.handlers.QueueListener(log_queue, target)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(_handler)
+    return _handler
+
+
+def stop_logging() -> None:
+    """Writes the queued records and detaches the handler set up by setup_logging"""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = _handler = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request an ID, taken from the
+    X-Request-ID header when the client sends one, that is added to its log
+    records and echoed in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = None
+        for name, header in scope["headers"]:
+            if name == b"x-request-id":
+                value = header.decode("latin-1")[:128]
+                break
+        value = value or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", value.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = request_id.set(value)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
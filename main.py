@@ -1,30 +1,259 @@
 import logging
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
 import time
 
-from fastapi import FastAPI, HTTPException, status, Body
-from fastapi.responses import Response, JSONResponse
-from fastapi.encoders import jsonable_encoder
-from pymongo import MongoClient
+from fastapi import FastAPI, HTTPException, status, Body, Query
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 
-from translate_handler import TranslateHandler
-from models import WordInputModel, WordModel
-from settings import MONGO_DETAILS, LANGUAGE_CODES
+from api_requests import close_client, upstream_governor, UpstreamError
+from cache import WordCache, NegativeCache
+from shared_cache import SharedWordCache
+from governor import CircuitOpenError
+import metrics
+from metrics import STAGE_LATENCY, CounterFunction, Gauge, MetricsMiddleware
+from log_config import setup_logging, stop_logging, dropped_records, RequestIdMiddleware
+from database import (
+    create_client,
+    get_words_collection,
+    get_missing_words_collection,
+    ensure_indexes,
+    ensure_missing_words_indexes,
+    insert_word,
+    insert_words,
+    build_projection,
+    WORD_PROJECTION,
+)
+from serialization import dumps, word_document
+from snapshot import Snapshot, is_snapshot_cursor
+from refresher import Refresher
+from write_behind import WriteBehind
+from warmup import WarmUp
+from popularity import HitCounter
+from suggest import SuggestIndex
+from search import build_query, with_grams, SEARCH_MODES
+from translate_handler import TranslateHandler, translation_flights
+from models import (
+    WordInputModel,
+    WordLanguagesInputModel,
+    WordModel,
+    WordResultModel,
+    is_empty_translation,
+)
+from settings import (
+    LANGUAGE_CODES,
+    BATCH_MAX_WORDS,
+    WORD_CACHE_MAX_ITEMS,
+    WORD_CACHE_MAX_BYTES,
+    WORD_CACHE_TTL,
+    CACHE_BACKEND,
+    SHARED_CACHE_PATH,
+    SHARED_CACHE_SLOT_SIZE,
+    SHARED_CACHE_WAYS,
+    SHARED_CACHE_LOCK_SHARDS,
+    SEARCH_DEFAULT_LIMIT,
+    SEARCH_MAX_LIMIT,
+    NEGATIVE_CACHE_MAX_ITEMS,
+    NEGATIVE_CACHE_TTL,
+    NEGATIVE_CACHE_MONGO,
+    SNAPSHOT_PATH,
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_SAMPLE_RATE,
+    LOG_QUEUE_SIZE,
+    WORD_FRESHNESS,
+    REFRESH_RATE,
+    REFRESH_QUEUE_SIZE,
+    WRITE_BEHIND,
+    WRITE_BEHIND_MAX_ITEMS,
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL,
+    WRITE_BEHIND_RETRIES,
+    WARMUP_PRELOAD,
+    WARMUP_SESSION_TOKENS,
+    WARMUP_TIMEOUT,
+    POPULARITY_FLUSH_INTERVAL,
+    POPULARITY_MAX_KEYS,
+    SUGGEST_DEFAULT_LIMIT,
+    SUGGEST_MAX_LIMIT,
+    SUGGEST_REBUILD_INTERVAL,
+    SUGGEST_SYNC_INTERVAL,
+)
+
+
+client: Optional[AsyncIOMotorClient] = None
+db: Optional[AsyncIOMotorCollection] = None
+snapshot: Optional[Snapshot] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, snapshot
+    setup_logging(
+        level=LOG_LEVEL,
+        path=LOG_FILE,
+        format=LOG_FORMAT,
+        sample_rate=LOG_SAMPLE_RATE,
+        queue_size=LOG_QUEUE_SIZE,
+    )
+    client = create_client()
+    db = get_words_collection(client)
+    await ensure_indexes(db)
+    if await db.find_one({"grams": None}, {"_id": 1}):
+        logging.warning(
+            "Stored words without the search index field are not found by "
+            "searches, run python migrate.py"
+        )
+    if NEGATIVE_CACHE_MONGO:
+        negative_cache.collection = get_missing_words_collection(client)
+        await ensure_missing_words_indexes(
+            negative_cache.collection, ttl=NEGATIVE_CACHE_TTL
+        )
+    if SNAPSHOT_PATH:
+        snapshot = Snapshot(SNAPSHOT_PATH)
+        logging.debug(
+            "Serving %d words from snapshot %s", snapshot.count, SNAPSHOT_PATH
+        )
+    refresher.collection = db
+    refresher.start()
+    if WRITE_BEHIND:
+        write_behind.collection = db
+        write_behind.start()
+    popularity.collection = db
+    popularity.start()
+    suggest_index.collection = db
+    logging.debug("Suggest index built with %d names", await suggest_index.build())
+    suggest_index.start()
+    await warmup.run(db, word_cache)
+    yield
+    await refresher.stop()
+    await write_behind.stop()
+    await popularity.stop()
+    await suggest_index.stop()
+    if snapshot:
+        snapshot.close()
+        snapshot = None
+    client.close()
+    await close_client()
+    stop_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+if CACHE_BACKEND == "shared":
+    word_cache = SharedWordCache(
+        SHARED_CACHE_PATH,
+        slots=min(WORD_CACHE_MAX_ITEMS, WORD_CACHE_MAX_BYTES // SHARED_CACHE_SLOT_SIZE),
+        slot_size=SHARED_CACHE_SLOT_SIZE,
+        ways=SHARED_CACHE_WAYS,
+        ttl=WORD_CACHE_TTL,
+        lock_shards=SHARED_CACHE_LOCK_SHARDS,
+    )
+else:
+    word_cache = WordCache(
+        max_items=WORD_CACHE_MAX_ITEMS,
+        max_bytes=WORD_CACHE_MAX_BYTES,
+        ttl=WORD_CACHE_TTL,
+    )
+negative_cache = NegativeCache(
+    max_items=NEGATIVE_CACHE_MAX_ITEMS, ttl=NEGATIVE_CACHE_TTL
+)
+refresher = Refresher(
+    upstream_governor,
+    freshness=WORD_FRESHNESS,
+    rate=REFRESH_RATE,
+    queue_size=REFRESH_QUEUE_SIZE,
+    on_refresh=word_cache.invalidate,
+)
+popularity = HitCounter(
+    flush_interval=POPULARITY_FLUSH_INTERVAL, max_keys=POPULARITY_MAX_KEYS
+)
+suggest_index = SuggestIndex(
+    sync_interval=SUGGEST_SYNC_INTERVAL, rebuild_interval=SUGGEST_REBUILD_INTERVAL
+)
+warmup = WarmUp(
+    preload=min(WARMUP_PRELOAD, WORD_CACHE_MAX_ITEMS),
+    session_tokens=WARMUP_SESSION_TOKENS,
+    timeout=WARMUP_TIMEOUT,
+)
+write_behind = WriteBehind(
+    max_items=WRITE_BEHIND_MAX_ITEMS,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+    retries=WRITE_BEHIND_RETRIES,
+)
 
+CounterFunction(
+    "translator_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+    collect=lambda: {
+        ("word", "hit"): word_cache.hits,
+        ("word", "miss"): word_cache.misses,
+        ("negative", "hit"): negative_cache.hits,
+        ("negative", "miss"): negative_cache.misses,
+    },
+)
+CounterFunction(
+    "translator_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+    collect=lambda: {(): dropped_records()},
+)
+CounterFunction(
+    "translator_singleflight_coalesced_total",
+    "Translations that awaited a fetch already in flight",
+    collect=lambda: {(): translation_flights.coalesced},
+)
+Gauge(
+    "translator_in_flight",
+    "Operations in progress by kind",
+    ["kind"],
+    collect=lambda: {
+        ("upstream",): upstream_governor.limiter.in_flight,
+        ("translation",): translation_flights.stats()["in_flight"],
+    },
+)
+Gauge(
+    "translator_upstream_concurrency_limit",
+    "Current adaptive concurrency limit of upstream calls",
+    collect=lambda: {(): int(upstream_governor.limiter.limit)},
+)
+Gauge(
+    "translator_upstream_circuit_open",
+    "1 while the upstream circuit breaker rejects calls",
+    collect=lambda: {(): int(upstream_governor.breaker.state != "closed")},
+)
 
-Log_Format = "%(asctime)s %(levelname)-8s %(name)-17s %(message)s"
-logging.basicConfig(filename="app.log", level=logging.DEBUG, format=Log_Format)
 
+def render_word(document: Optional[dict]) -> bytes:
+    """Encodes a Mongo document to a JSON response body"""
+    return dumps(document)
 
-app = FastAPI()
-client = MongoClient(MONGO_DETAILS)
-db = client.vacabulary.words
+
+def word_response(
+    body: bytes, status_code: int, headers: Optional[dict] = None
+) -> Response:
+    """
+    Builds a JSON response from an already encoded body.
+
+    Returning a Response skips the response_model validation, the documents are
+    written by this service and are not validated again on the way out.
+    """
+    return Response(
+        content=body,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
 
 
 @app.post(
     "/translate_word", response_description="Translate word", response_model=WordModel
 )
-def create_word(word: WordInputModel = Body(...)):
+async def create_word(word: WordInputModel = Body(...)):
     """
     Translates a word and saves it to the Mongo database words collection
 
@@ -36,34 +265,378 @@ def create_word(word: WordInputModel = Body(...)):
     json:
         A JSON object containing the word and its translation
     """
-    logging.debug(f"Creating new word {word.word} in language {word.lang}")
+    logging.debug("Creating new word %s in language %s", word.word, word.lang)
     if word.lang not in LANGUAGE_CODES:
         raise HTTPException(
             status_code=404,
             detail="No translation found. Please, check language",
         )
-    translation = db.find_one({"name": word.word, "lang": word.lang})
+    if cached := word_cache.get(word.word, word.lang):
+        logging.debug(
+            "Translation for word (%s) and language (%s) is found in the cache.",
+            word.word,
+            word.lang,
+        )
+        popularity.hit(word.word, word.lang)
+        return word_response(cached, status_code=status.HTTP_200_OK)
+    if snapshot and (body := snapshot.get(word.word, word.lang)):
+        popularity.hit(word.word, word.lang)
+        return word_response(body, status_code=status.HTTP_200_OK)
+    if buffered := write_behind.get(word.word, word.lang):
+        popularity.hit(word.word, word.lang)
+        return word_response(render_word(buffered), status_code=status.HTTP_200_OK)
+    with STAGE_LATENCY.time("mongo_find"):
+        translation = await db.find_one(
+            {"name": word.word, "lang": word.lang}, WORD_PROJECTION
+        )
     if translation:
         logging.debug(
-            f"Translation for word ({word.word}) and language ({word.lang}) is found in the database."
+            "Translation for word (%s) and language (%s) is found in the database.",
+            word.word,
+            word.lang,
+        )
+        refresher.check(translation)
+        popularity.hit(word.word, word.lang)
+        body = render_word(translation)
+        word_cache.set(word.word, word.lang, body)
+        return word_response(body, status_code=status.HTTP_200_OK)
+    if await negative_cache.contains(word.word, word.lang):
+        logging.debug("Word (%s) is known to have no translation", word.word)
+        raise HTTPException(
+            status_code=404,
+            detail="No translation found. Please, check word",
         )
-        return JSONResponse(status_code=status.HTTP_200_OK, content=translation)
     translator = TranslateHandler()
-    res = translator.get_translation_obj(word=word.word, lang=word.lang)
-    if (
-        not res.definitions
-        and not res.examples
-        and not res.synonyms
-        and not res.translations
-    ):
+    try:
+        res = await translator.get_translation_obj(word=word.word, lang=word.lang)
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503, detail="Translation service is temporarily unavailable"
+        )
+    except UpstreamError as e:
+        logging.debug("Upstream failed for word (%s): %s", word.word, e)
+        raise HTTPException(
+            status_code=502, detail="Translation service is unavailable"
+        )
+    if is_empty_translation(res):
+        await negative_cache.add(word.word, word.lang)
         raise HTTPException(
             status_code=404,
             detail="No translation found. Please, check word",
         )
-    new_word = db.insert_one(jsonable_encoder(res))
-    created_word = db.find_one({"_id": new_word.inserted_id})
-    logging.debug(f"New word successfully created with ID: {new_word.inserted_id}")
-    return JSONResponse(status_code=status.HTTP_201_CREATED, content=created_word)
+    new_word = word_document(res)
+    suggest_index.add(word.word, word.lang)
+    if write_behind.enabled:
+        await write_behind.put(new_word)
+        body = render_word(new_word)
+        word_cache.set(word.word, word.lang, body)
+        return word_response(body, status_code=status.HTTP_201_CREATED)
+    with STAGE_LATENCY.time("mongo_insert"):
+        existing = await insert_word(db, with_grams(new_word))
+    if existing:
+        logging.debug(
+            "Word (%s) was created concurrently, returning stored one", word.word
+        )
+        popularity.hit(word.word, word.lang)
+        body = render_word(existing)
+        word_cache.set(word.word, word.lang, body)
+        return word_response(body, status_code=status.HTTP_200_OK)
+    logging.debug("New word successfully created with ID: %s", new_word["_id"])
+    body = render_word(new_word)
+    word_cache.set(word.word, word.lang, body)
+    return word_response(body, status_code=status.HTTP_201_CREATED)
+
+
+async def resolve_words(
+    keys: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], WordResultModel]:
+    """
+    Looks several (word, lang) pairs up with one Mongo query and translates the
+    missing ones in batched upstream requests sharing the session tokens.
+
+    Returns:
+        The result of every pair, new translations are saved to the words collection
+    """
+    results = {}
+    for name, lang in keys:
+        if lang not in LANGUAGE_CODES:
+            results[(name, lang)] = WordResultModel(
+                word=name,
+                lang=lang,
+                status_code=404,
+                detail="No translation found. Please, check language",
+            )
+
+    for name, lang in keys:
+        if (name, lang) not in results and (buffered := write_behind.get(name, lang)):
+            results[(name, lang)] = WordResultModel(
+                word=name,
+                lang=lang,
+                status_code=status.HTTP_200_OK,
+                translation=buffered,
+            )
+
+    lookup = [key for key in keys if key not in results]
+    if lookup:
+        with STAGE_LATENCY.time("mongo_find"):
+            found = await db.find(
+                {
+                    "name": {"$in": list({name for name, _ in lookup})},
+                    "lang": {"$in": list({lang for _, lang in lookup})},
+                },
+                WORD_PROJECTION,
+            ).to_list(length=None)
+        for document in found:
+            key = (document["name"], document["lang"])
+            if key in results or key not in lookup:
+                continue
+            refresher.check(document)
+            results[key] = WordResultModel(
+                word=key[0],
+                lang=key[1],
+                status_code=status.HTTP_200_OK,
+                translation=document,
+            )
+
+    for name, lang in lookup:
+        if (name, lang) not in results and await negative_cache.contains(name, lang):
+            results[(name, lang)] = WordResultModel(
+                word=name,
+                lang=lang,
+                status_code=404,
+                detail="No translation found. Please, check word",
+            )
+
+    misses = [key for key in lookup if key not in results]
+    if misses:
+        logging.debug("Translating %d words missing in the database", len(misses))
+        translated = await TranslateHandler().get_translation_objs(misses)
+        new_words = []
+        for (name, lang), res in zip(misses, translated):
+            if isinstance(res, CircuitOpenError):
+                results[(name, lang)] = WordResultModel(
+                    word=name,
+                    lang=lang,
+                    status_code=503,
+                    detail="Translation service is temporarily unavailable",
+                )
+                continue
+            if isinstance(res, UpstreamError):
+                logging.debug("Upstream failed for word (%s): %s", name, res)
+                results[(name, lang)] = WordResultModel(
+                    word=name,
+                    lang=lang,
+                    status_code=502,
+                    detail="Translation service is unavailable",
+                )
+                continue
+            if is_empty_translation(res):
+                await negative_cache.add(name, lang)
+                results[(name, lang)] = WordResultModel(
+                    word=name,
+                    lang=lang,
+                    status_code=404,
+                    detail="No translation found. Please, check word",
+                )
+                continue
+            new_word = word_document(res)
+            new_words.append(new_word)
+            suggest_index.add(name, lang)
+            results[(name, lang)] = WordResultModel(
+                word=name,
+                lang=lang,
+                status_code=status.HTTP_201_CREATED,
+                translation=new_word,
+            )
+        if new_words and write_behind.enabled:
+            for new_word in new_words:
+                await write_behind.put(new_word)
+        elif new_words:
+            inserted = await insert_words(
+                db, [with_grams(new_word) for new_word in new_words]
+            )
+            logging.debug("%d new words successfully created", inserted)
+
+    for (name, lang), result in results.items():
+        if result.translation is not None:
+            popularity.hit(name, lang)
+    return results
+
+
+@app.post(
+    "/translate_words",
+    response_description="Translate words",
+    response_model=List[WordResultModel],
+)
+async def create_words(words: List[WordInputModel] = Body(...)):
+    """
+    Translates several words at once and saves the new ones to the Mongo database words collection
+
+    words : list
+        Objects with the word to be translated and its language
+
+    Returns
+    -------
+    list:
+        A result per requested word, in request order, with its status code and translation
+    """
+    if len(words) > BATCH_MAX_WORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many words. Maximum is {BATCH_MAX_WORDS}",
+        )
+    logging.debug("Creating %d words", len(words))
+    results = await resolve_words(
+        list(dict.fromkeys((word.word, word.lang) for word in words))
+    )
+    return word_response(
+        dumps(
+            [results[(word.word, word.lang)].dict(exclude_none=True) for word in words]
+        ),
+        status_code=status.HTTP_200_OK,
+    )
+
+
+@app.post(
+    "/translate_languages",
+    response_description="Translate a word into several languages",
+    response_model=List[WordResultModel],
+)
+async def create_word_languages(word: WordLanguagesInputModel = Body(...)):
+    """
+    Translates a word into several languages at once and saves the new translations to the Mongo database words collection
+
+    word : str
+        The word to be translated
+    langs : list
+        Codes of the languages to translate the word to
+
+    Returns
+    -------
+    list:
+        A result per requested language, in request order, with its status code and translation
+    """
+    if len(word.langs) > BATCH_MAX_WORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many languages. Maximum is {BATCH_MAX_WORDS}",
+        )
+    logging.debug("Translating word %s into %d languages", word.word, len(word.langs))
+    results = await resolve_words(
+        [(word.word, lang) for lang in dict.fromkeys(word.langs)]
+    )
+    return word_response(
+        dumps(
+            [results[(word.word, lang)].dict(exclude_none=True) for lang in word.langs]
+        ),
+        status_code=status.HTTP_200_OK,
+    )
+
+
+@app.get("/metrics", response_description="Prometheus metrics")
+async def show_metrics():
+    """
+    Exposes the service metrics in the Prometheus text format
+
+    Returns
+    -------
+    text:
+        Latency histograms per pipeline stage and endpoint, request counts, cache, upstream and in-flight metrics
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/admin/stats", response_description="Service statistics")
+async def show_stats():
+    """
+    Reports in-process statistics of the translation pipeline
+
+    Returns
+    -------
+    json:
+        Counters of the single-flight layer, the caches and the upstream governor
+    """
+    return {
+        "singleflight": translation_flights.stats(),
+        "word_cache": word_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "upstream": upstream_governor.stats(),
+        "snapshot": snapshot.stats() if snapshot else None,
+        "refresher": refresher.stats(),
+        "write_behind": write_behind.stats() if write_behind.enabled else None,
+        "popularity": popularity.stats(),
+        "suggest": suggest_index.stats(),
+    }
+
+
+@app.get(
+    "/suggest/{prefix}",
+    response_description="Suggest words",
+    response_model=List[str],
+)
+async def suggest_words(
+    prefix: str,
+    lang: Optional[str] = None,
+    limit: int = Query(SUGGEST_DEFAULT_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT),
+):
+    """
+    Suggests stored words starting with the typed prefix, served from memory
+
+    prefix : str
+        The beginning of the word
+    lang : str
+        Only suggest words stored in this language
+    limit : int
+        Maximum number of words to return, SUGGEST_DEFAULT_LIMIT by default
+
+    Returns
+    -------
+    list:
+        Names of the words in alphabetical order
+    """
+    return word_response(
+        dumps(suggest_index.suggest(prefix, limit, lang)),
+        status_code=status.HTTP_200_OK,
+    )
+
+
+@app.get("/admin/top_words", response_description="Most requested words")
+async def show_top_words(limit: int = Query(100, ge=1, le=SEARCH_MAX_LIMIT)):
+    """
+    Lists the most requested stored words
+
+    limit : int
+        Maximum number of words to return
+
+    Returns
+    -------
+    list:
+        Name, language and hit count of the words, most requested first. Hits of the last POPULARITY_FLUSH_INTERVAL seconds may not be counted yet
+    """
+    return await popularity.top(limit)
+
+
+@app.get("/admin/ready", response_description="Readiness")
+async def show_ready():
+    """
+    Reports the startup warm-up of this worker. The server only accepts
+    connections once the warm-up has finished, so any answer means ready
+
+    Returns
+    -------
+    json:
+        The duration and outcome of every warm-up step
+    """
+    return JSONResponse(content=warmup.stats(), status_code=status.HTTP_200_OK)
+
+
+def count_exact_hit(word: str, document: dict):
+    """
+    Counts a search result as a lookup only when it is the searched name
+    itself, and only when its language was projected
+    """
+    if document.get("name") == word and "lang" in document:
+        popularity.hit(word, document.get("lang"))
 
 
 @app.get(
@@ -71,27 +644,91 @@ def create_word(word: WordInputModel = Body(...)):
     response_description="Get words by string",
     response_model=List[WordModel],
 )
-def show_word(word: Optional[str]):
+async def show_word(
+    word: Optional[str],
+    mode: str = Query("contains", regex=f"^({'|'.join(SEARCH_MODES)})$"),
+    limit: Optional[int] = Query(None, ge=1, le=SEARCH_MAX_LIMIT),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", regex="^(json|ndjson)$"),
+):
     """
     Finds words containing the specified string value in the database
 
     word : str
         The string value to search for
+    mode : str
+        "contains" (default) to match the value anywhere in the word, "prefix" to match the beginning only
+    limit : int
+        Maximum number of words to return, SEARCH_DEFAULT_LIMIT by default. Not limited in "ndjson" format unless given
+    after : str
+        Cursor of the next page from the X-Next-Cursor header: the "_id" of the last word of the previous page, or an opaque cursor for pages served from the snapshot
+    fields : str
+        Comma-separated list of fields to return, "_id" is always returned
+    format : str
+        "json" (default) for a JSON list, "ndjson" to stream one JSON document per line
 
     Returns
     -------
     list:
         A list of dictionaries representing words containing the specified string value
     """
-    if words := db.find({"name": {"$regex": f".*{word}.*"}}):
-        logging.debug(f"Words for string value ({word}) successfully retrieved")
-        return list(words)
+    try:
+        projection = build_projection(fields.split(",") if fields else [])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (
+        snapshot
+        and mode == "prefix"
+        and not fields
+        and format == "json"
+        and (after is None or is_snapshot_cursor(after))
+    ):
+        try:
+            bodies, cursor = snapshot.search(word, limit or SEARCH_DEFAULT_LIMIT, after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # later pages of a snapshot search stay in the snapshot
+        if bodies or after is not None:
+            logging.debug("Words for string value (%s) found in the snapshot", word)
+            headers = {"X-Next-Cursor": cursor} if cursor else {}
+            return word_response(
+                b"[" + b",".join(bodies) + b"]",
+                status_code=status.HTTP_200_OK,
+                headers=headers,
+            )
+    query = build_query(word, mode)
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    words = db.find(query, projection).sort("_id", 1)
 
-    raise HTTPException(status_code=404, detail=f"Word {word} not found")
+    if format == "ndjson":
+        if limit is not None:
+            words = words.limit(limit)
+
+        async def stream_words():
+            async for document in words:
+                count_exact_hit(word, document)
+                yield render_word(document) + b"\n"
+
+        logging.debug("Streaming words for string value (%s)", word)
+        return StreamingResponse(stream_words(), media_type="application/x-ndjson")
+
+    limit = limit or SEARCH_DEFAULT_LIMIT
+    with STAGE_LATENCY.time("mongo_search"):
+        documents = await words.limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(documents) > limit:
+        documents = documents[:limit]
+        headers["X-Next-Cursor"] = str(documents[-1]["_id"])
+    for document in documents:
+        count_exact_hit(word, document)
+    logging.debug("Words for string value (%s) successfully retrieved", word)
+    return word_response(dumps(documents), status_code=status.HTTP_200_OK, headers=headers)
 
 
 @app.delete("/{word}", response_description="Delete a word")
-def delete_word(word: str):
+async def delete_word(word: str):
     """
     Deletes a word from the database
 
@@ -103,11 +740,18 @@ def delete_word(word: str):
     str:
         A message confrming that the word has been deleted
     """
-    logging.debug(f"Need to delete: {word}")
-    delete_result = db.delete_one({"name": word})
+    logging.debug("Need to delete: %s", word)
+    # before the Mongo delete, which then also removes what a running flush wrote
+    discarded = await write_behind.discard(word)
+    with STAGE_LATENCY.time("mongo_delete"):
+        delete_result = await db.delete_one({"name": word})
+    word_cache.invalidate(word)
+    hidden = snapshot is not None and snapshot.discard(word)
 
-    if delete_result.deleted_count == 1:
-        logging.debug(f"Word {word} was successfully deleted")
+    if delete_result.deleted_count == 1 or discarded or hidden:
+        # the word may still be stored in other languages
+        suggest_index.set_langs(word, set(await db.distinct("lang", {"name": word})))
+        logging.debug("Word %s was successfully deleted", word)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     raise HTTPException(status_code=404, detail=f"Word {word} not found")
@@ -0,0 +1,45 @@
+"""
+Migrates the words collection stored by older versions.
+
+    python migrate.py
+
+Replaces a non-unique (name, lang) index and removes duplicated words, keeping
+one document per word; every removed _id is logged. Then adds the n-gram
+search field to words stored before it existed. Run it once before starting
+the workers, which only report what needs migrating.
+"""
+import asyncio
+import logging
+import argparse
+from typing import List, Optional
+
+from database import create_client, get_words_collection, migrate_word_index
+from search import backfill_grams
+
+
+async def migrate(args: argparse.Namespace) -> int:
+    """Runs the migration described by the command-line arguments"""
+    client = create_client()
+    collection = get_words_collection(client)
+    try:
+        removed = await migrate_word_index(collection)
+        logging.info(
+            "The (name, lang) index is unique, %d duplicated words removed", removed
+        )
+        backfilled = await backfill_grams(collection)
+        logging.info("Search index field added to %d stored words", backfilled)
+    finally:
+        client.close()
+    return removed
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Migrate the words collection stored by older versions"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(migrate(parse_args()))
@@ -1,6 +1,8 @@
+import datetime
+
 from pydantic import BaseModel, Field
 from bson.objectid import ObjectId
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 
 class PyObjectId(ObjectId):
@@ -27,6 +29,7 @@ class WordModel(BaseModel):
     synonyms: List[str] = Field(...)
     translations: List[str] = Field(...)
     examples: List[str] = Field(...)
+    fetched_at: Optional[datetime.datetime] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -49,6 +52,29 @@ class WordModel(BaseModel):
         }
 
 
+def is_empty_translation(word: WordModel) -> bool:
+    """Checks whether Google returned nothing useful for the word"""
+    return (
+        not word.definitions
+        and not word.examples
+        and not word.synonyms
+        and not word.translations
+    )
+
+
 class WordInputModel(BaseModel):
     word: str
     lang: Optional[str]
+
+
+class WordLanguagesInputModel(BaseModel):
+    word: str
+    langs: List[str]
+
+
+class WordResultModel(BaseModel):
+    word: str
+    lang: Optional[str]
+    status_code: int
+    translation: Optional[Dict[str, Any]]
+    detail: Optional[str]
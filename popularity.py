@@ -0,0 +1,98 @@
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+Key = Tuple[str, Optional[str]]
+
+
+class HitCounter:
+    """
+    Counts lookups of stored words in memory and adds them to the ``hits``
+    field of their documents with one unordered bulk of $inc updates every
+    ``flush_interval`` seconds, or as soon as ``max_keys`` words were counted.
+    """
+
+    def __init__(self, flush_interval: float, max_keys: int, collection=None):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.collection = collection
+        self._counts: Counter = Counter()
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failed = 0
+
+    def hit(self, name: str, lang: Optional[str]) -> None:
+        self._counts[(name, lang)] += 1
+        if self._full is not None and len(self._counts) >= self.max_keys:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """
+        Writes the counted hits.
+
+        Returns:
+            The number of words whose counter was written.
+        """
+        counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        now = datetime.datetime.utcnow()
+        requests = [
+            UpdateOne(
+                {"name": name, "lang": lang},
+                {"$inc": {"hits": count}, "$set": {"last_hit_at": now}},
+            )
+            for (name, lang), count in counts.items()
+        ]
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except Exception as e:
+            self.failed += len(counts)
+            logging.warning("Failed to write hits of %d words: %s", len(counts), e)
+            return 0
+        self.flushed += len(counts)
+        return len(counts)
+
+    async def run(self, full: asyncio.Event):
+        while True:
+            try:
+                await asyncio.wait_for(full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            full.clear()
+            await self.flush()
+
+    async def top(self, limit: int) -> List[Dict[str, Any]]:
+        """Returns the most requested stored words, hits not yet flushed excluded"""
+        words = self.collection.find(
+            {"hits": {"$gt": 0}}, {"_id": 0, "name": 1, "lang": 1, "hits": 1}
+        ).sort("hits", -1)
+        return await words.limit(limit).to_list(length=limit)
+
+    def start(self):
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self.run(self._full))
+
+    async def stop(self):
+        """Stops the background task and writes the remaining hits"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._full = None
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._counts),
+            "flushed": self.flushed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,256 @@
+"""
+Seeds the words collection with the translations of a wordlist.
+
+    python prewarm.py words.txt --lang de --lang fr --concurrency 8
+    cat words.txt | python prewarm.py - --lang de
+
+Words already stored are skipped with one $in lookup per chunk, the rest are
+translated in batches with at most --concurrency batchexecute requests in
+flight and written with unordered bulk inserts. The number of processed lines
+is saved to --state after every chunk, so an interrupted run resumes where it
+stopped. It is not advanced past a chunk with failed translations, so a resumed
+run retries them. The run stops when the upstream circuit breaker opens.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+import httpx
+
+from api_requests import close_client, UpstreamError
+from database import create_client, get_words_collection, ensure_indexes, insert_words
+from governor import CircuitOpenError
+from models import is_empty_translation
+from search import with_grams
+from serialization import word_document
+from settings import BATCH_MAX_RPCS, LANGUAGE_CODES
+from translate_handler import TranslateHandler
+
+
+def read_chunks(
+    lines: TextIO, chunk_size: int, skip: int = 0
+) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yields chunks of words from a wordlist with one word per line.
+
+    Empty lines and lines starting with "#" are ignored. The first ``skip``
+    lines are not read again.
+
+    Yields:
+        The number of lines read so far and the words of the chunk.
+    """
+    words = []
+    line_number = yielded = skip
+    for line_number, line in enumerate(lines, start=1):
+        if line_number <= skip:
+            continue
+        word = line.strip()
+        if word and not word.startswith("#"):
+            words.append(word)
+        if len(words) >= chunk_size:
+            yield line_number, words
+            words, yielded = [], line_number
+    if line_number > yielded:
+        yield line_number, words
+
+
+def load_state(path: Optional[str]) -> int:
+    """Returns the number of lines processed by a previous run"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+
+def save_state(path: Optional[str], processed_lines: int):
+    """Atomically records the number of processed lines"""
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(processed_lines))
+    os.replace(tmp_path, path)
+
+
+class Prewarmer:
+    """
+    Translates missing words of a wordlist and stores them in the words collection.
+    """
+
+    def __init__(self, collection, langs: List[str], concurrency: int):
+        self.collection = collection
+        self.langs = langs
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.handler = TranslateHandler()
+        self.stored = 0
+        self.inserted = 0
+        self.not_found = 0
+        self.failed = 0
+
+    async def find_missing(self, words: List[str]) -> List[Tuple[str, str]]:
+        """Returns the (word, lang) pairs of the chunk that are not stored yet"""
+        found = self.collection.find(
+            {"name": {"$in": words}, "lang": {"$in": self.langs}},
+            {"_id": 0, "name": 1, "lang": 1},
+        )
+        stored = {(doc["name"], doc["lang"]) async for doc in found}
+        self.stored += len(stored)
+        return [
+            (word, lang)
+            for word in dict.fromkeys(words)
+            for lang in self.langs
+            if (word, lang) not in stored
+        ]
+
+    async def translate(self, words: List[Tuple[str, str]]) -> List[dict]:
+        """Translates one batch of words, returning the documents to insert"""
+        async with self.semaphore:
+            try:
+                translated = await self.handler.get_translation_objs(words)
+            except (UpstreamError, httpx.HTTPError) as e:
+                logging.warning("Failed to translate %d words: %s", len(words), e)
+                self.failed += len(words)
+                return []
+        documents = []
+        failed = 0
+        for res in translated:
+            if isinstance(res, CircuitOpenError):
+                raise res
+            if isinstance(res, Exception):
+                failed += 1
+            elif is_empty_translation(res):
+                self.not_found += 1
+            else:
+                documents.append(with_grams(word_document(res)))
+        if failed:
+            logging.warning("Failed to translate %d of %d words", failed, len(words))
+            self.failed += failed
+        return documents
+
+    async def process(self, words: List[str]) -> int:
+        """
+        Stores the translations of the chunk's missing words.
+
+        Returns:
+            The number of words whose translation failed.
+
+        Raises:
+            CircuitOpenError: once every batch finished, if the circuit breaker
+                opened. The translated words are stored first.
+        """
+        failed = self.failed
+        missing = await self.find_missing(words)
+        batches = [
+            missing[i : i + BATCH_MAX_RPCS]
+            for i in range(0, len(missing), BATCH_MAX_RPCS)
+        ]
+        results = await asyncio.gather(
+            *(self.translate(batch) for batch in batches), return_exceptions=True
+        )
+        documents = [
+            document
+            for batch in results
+            if not isinstance(batch, BaseException)
+            for document in batch
+        ]
+        if documents:
+            self.inserted += await insert_words(self.collection, documents)
+        for batch in results:
+            if isinstance(batch, BaseException):
+                raise batch
+        return self.failed - failed
+
+
+async def prewarm(args: argparse.Namespace) -> Prewarmer:
+    """Runs the prewarm described by the command-line arguments"""
+    client = create_client()
+    collection = get_words_collection(client)
+    await ensure_indexes(collection)
+    prewarmer = Prewarmer(collection, langs=args.lang, concurrency=args.concurrency)
+    skip = load_state(args.state)
+    if skip:
+        logging.info("Resuming after line %d", skip)
+
+    started = time.monotonic()
+    processed_words = 0
+    complete = True
+    source = sys.stdin if args.wordlist == "-" else open(args.wordlist)
+    try:
+        for line_number, words in read_chunks(source, args.chunk_size, skip=skip):
+            try:
+                failed = await prewarmer.process(words)
+            except CircuitOpenError as e:
+                logging.error(
+                    "Stopping at line %d, the upstream circuit breaker is open (%s); "
+                    "--state stays at the previous chunk",
+                    line_number,
+                    e,
+                )
+                break
+            if failed and complete:
+                logging.warning(
+                    "Translations failed up to line %d, --state stays at the previous "
+                    "chunk so a resumed run retries them",
+                    line_number,
+                )
+                complete = False
+            if complete:
+                save_state(args.state, line_number)
+            processed_words += len(words)
+            elapsed = time.monotonic() - started
+            logging.info(
+                "line %d: %d words, %d inserted, %d already stored, "
+                "%d not found, %d failed, %.1f words/s",
+                line_number,
+                processed_words,
+                prewarmer.inserted,
+                prewarmer.stored,
+                prewarmer.not_found,
+                prewarmer.failed,
+                processed_words / elapsed if elapsed else 0,
+            )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        client.close()
+        await close_client()
+    return prewarmer
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Translate a wordlist into the words collection"
+    )
+    parser.add_argument("wordlist", help='file with one word per line, "-" for stdin')
+    parser.add_argument(
+        "--lang",
+        action="append",
+        required=True,
+        help="target language code, can be repeated",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="maximum number of batchexecute requests in flight",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=500, help="words looked up per $in query"
+    )
+    parser.add_argument(
+        "--state", help="file recording progress, used to resume an interrupted run"
+    )
+    args = parser.parse_args(argv)
+    for lang in args.lang:
+        if lang not in LANGUAGE_CODES:
+            parser.error(f"unknown language {lang}")
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(prewarm(parse_args()))
@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import logging
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from governor import TokenBucket, UpstreamGovernor
+from models import is_empty_translation
+from serialization import word_document
+from translate_handler import TranslateHandler
+
+Key = Tuple[str, Optional[str]]
+
+
+class Refresher:
+    """
+    Background re-translation of stored words older than ``freshness`` seconds.
+
+    Stale words are still served; ``schedule`` only queues them. A single worker
+    re-fetches queued words at most ``rate`` times per second and only while
+    the upstream governor has spare concurrency, so refreshes never take the
+    place of foreground misses. A word is queued at most once at a time and
+    words that do not fit in the queue are dropped until they are read again.
+    """
+
+    def __init__(
+        self,
+        governor: UpstreamGovernor,
+        freshness: float,
+        rate: float,
+        queue_size: int,
+        collection=None,
+        on_refresh: Optional[Callable[[str, Optional[str]], Any]] = None,
+        idle_wait: float = 0.5,
+    ):
+        self.governor = governor
+        self.freshness = freshness
+        self.bucket = TokenBucket(rate, burst=1)
+        self.queue_size = queue_size
+        self.collection = collection
+        self.on_refresh = on_refresh
+        self.idle_wait = idle_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[Key] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def is_stale(self, document: Dict[str, Any]) -> bool:
+        """Words stored before fetched_at existed are stale"""
+        if self.freshness <= 0:
+            return False
+        fetched_at = document.get("fetched_at")
+        if fetched_at is None:
+            return True
+        age = datetime.datetime.utcnow() - fetched_at
+        return age.total_seconds() > self.freshness
+
+    def schedule(self, name: str, lang: Optional[str]) -> bool:
+        """Queues a refresh of the word unless it is already queued"""
+        if self._queue is None or (name, lang) in self._pending:
+            return False
+        try:
+            self._queue.put_nowait((name, lang))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add((name, lang))
+        return True
+
+    def check(self, document: Dict[str, Any]) -> None:
+        """Schedules a refresh of a stored word if it is stale"""
+        if self.is_stale(document):
+            self.schedule(document["name"], document.get("lang"))
+
+    async def _wait_for_headroom(self):
+        limiter = self.governor.limiter
+        while (
+            self.governor.breaker.state != "closed"
+            or limiter.in_flight >= limiter.limit / 2
+        ):
+            await asyncio.sleep(self.idle_wait)
+
+    async def refresh(self, name: str, lang: Optional[str]) -> bool:
+        """
+        Re-translates a stored word and updates its document.
+
+        Returns:
+            True if the document was updated.
+        """
+        word = await TranslateHandler().get_translation_obj(word=name, lang=lang)
+        if is_empty_translation(word):
+            # keep the stored translation when Google has nothing this time
+            logging.debug("Refresh of word (%s) returned no translation", name)
+            return False
+        document = word_document(word)
+        del document["_id"]
+        await self.collection.update_one({"name": name, "lang": lang}, {"$set": document})
+        if self.on_refresh is not None:
+            self.on_refresh(name, lang)
+        return True
+
+    async def run(self, queue: asyncio.Queue):
+        while True:
+            name, lang = await queue.get()
+            try:
+                await self.bucket.acquire()
+                await self._wait_for_headroom()
+                if await self.refresh(name, lang):
+                    self.refreshed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.debug("Refresh of word (%s) failed: %s", name, e)
+            finally:
+                self._pending.discard((name, lang))
+                queue.task_done()
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._pending.clear()
+        self._task = asyncio.create_task(self.run(self._queue))
+
+    async def stop(self):
+        """Cancels the worker, queued refreshes are abandoned"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
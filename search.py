@@ -0,0 +1,68 @@
+import re
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+
+# substrings of up to this many characters are indexed for "contains" queries
+GRAM_SIZE = 3
+SEARCH_MODES = ("contains", "prefix")
+
+
+def ngrams(name: str, size: int = GRAM_SIZE) -> List[str]:
+    """
+    Returns the distinct substrings of ``name`` that are 1 to ``size``
+    characters long. A word contains a query of at most ``size`` characters
+    exactly when the query is one of its n-grams.
+    """
+    grams = dict.fromkeys(
+        name[i : i + n]
+        for n in range(1, size + 1)
+        for i in range(len(name) - n + 1)
+    )
+    return list(grams)
+
+
+def with_grams(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a copy of a word document with its n-gram index field"""
+    return {**document, "grams": ngrams(document["name"])}
+
+
+def build_query(value: str, mode: str = "contains") -> Dict[str, Any]:
+    """
+    Builds the Mongo filter for words matching ``value``.
+
+    ``prefix`` uses an anchored regex served by the (name, lang) index.
+    ``contains`` looks the query up in the multikey ``grams`` index: short
+    queries match a gram exactly, longer ones must contain all of their
+    trigrams and are then verified with an escaped regex.
+    """
+    if mode == "prefix":
+        return {"name": {"$regex": "^" + re.escape(value)}}
+    if len(value) <= GRAM_SIZE:
+        return {"grams": value}
+    trigrams = [value[i : i + GRAM_SIZE] for i in range(len(value) - GRAM_SIZE + 1)]
+    return {
+        "grams": {"$all": list(dict.fromkeys(trigrams))},
+        "name": {"$regex": re.escape(value)},
+    }
+
+
+async def backfill_grams(collection, batch_size: int = 1000) -> int:
+    """
+    Adds the n-gram field to documents stored before the search index existed.
+
+    Returns:
+        The number of updated documents.
+    """
+    updated = 0
+    cursor = collection.find({"grams": None}, {"name": 1})
+    while batch := await cursor.to_list(length=batch_size):
+        await collection.bulk_write(
+            [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"grams": ngrams(doc["name"])}})
+                for doc in batch
+            ],
+            ordered=False,
+        )
+        updated += len(batch)
+    return updated
@@ -0,0 +1,50 @@
+import json
+import datetime
+from typing import Any
+
+from bson.objectid import ObjectId
+
+from models import WordModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encodes the non-JSON values found in Mongo documents"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encodes a value to compact UTF-8 JSON.
+
+    Uses orjson when it is installed and the standard library otherwise; ObjectId
+    values are written as strings, so Mongo documents need no preprocessing.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(
+        value, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def word_document(word: WordModel) -> dict:
+    """
+    Converts a word built by the translate handler to its Mongo document.
+
+    The model is trusted, so this is a plain field copy rather than a pass of
+    jsonable_encoder over every nested value. Words without ``fetched_at`` were
+    just fetched from Google.
+    """
+    document = word.dict(by_alias=True)
+    document["_id"] = str(document["_id"])
+    if document["fetched_at"] is None:
+        document["fetched_at"] = datetime.datetime.utcnow()
+    return document
@@ -6,3 +6,102 @@ load_dotenv()
 GOOGLE_URL = os.getenv("GOOGLE_URL")
 MONGO_DETAILS = os.getenv("MONGO_DETAILS")
 LANGUAGE_CODES = os.getenv("LANGUAGE_CODES")
+
+# upstream (Google Translate) HTTP client
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 5))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", 5))
+
+# Google page session tokens (f.sid, bl, rpcids) are reused between requests
+SESSION_TOKENS_TTL = float(os.getenv("SESSION_TOKENS_TTL", 3600))
+
+# batch translation
+BATCH_MAX_WORDS = int(os.getenv("BATCH_MAX_WORDS", 500))
+BATCH_MAX_RPCS = int(os.getenv("BATCH_MAX_RPCS", 25))
+
+# in-process cache of ready-to-send word responses
+WORD_CACHE_MAX_ITEMS = int(os.getenv("WORD_CACHE_MAX_ITEMS", 10000))
+WORD_CACHE_MAX_BYTES = int(os.getenv("WORD_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+WORD_CACHE_TTL = float(os.getenv("WORD_CACHE_TTL", 3600))
+# "memory" for a cache per worker, "shared" for one memory-mapped cache per host
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "/dev/shm/translator-word-cache")
+SHARED_CACHE_SLOT_SIZE = int(os.getenv("SHARED_CACHE_SLOT_SIZE", 4096))
+SHARED_CACHE_WAYS = int(os.getenv("SHARED_CACHE_WAYS", 8))
+SHARED_CACHE_LOCK_SHARDS = int(os.getenv("SHARED_CACHE_LOCK_SHARDS", 64))
+
+# Mongo connection pool
+MONGO_DATABASE = os.getenv("MONGO_DATABASE", "vacabulary")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+)
+
+# GET /{word} result pages
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", 100))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 1000))
+
+# words Google has no translation for
+NEGATIVE_CACHE_MAX_ITEMS = int(os.getenv("NEGATIVE_CACHE_MAX_ITEMS", 100000))
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", 24 * 3600))
+NEGATIVE_CACHE_MONGO = os.getenv("NEGATIVE_CACHE_MONGO", "false").lower() == "true"
+
+# upstream rate limit, adaptive concurrency, retries and circuit breaker
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", 20))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", 40))
+UPSTREAM_CONCURRENCY_INITIAL = int(os.getenv("UPSTREAM_CONCURRENCY_INITIAL", 10))
+UPSTREAM_CONCURRENCY_MIN = int(os.getenv("UPSTREAM_CONCURRENCY_MIN", 1))
+UPSTREAM_CONCURRENCY_MAX = int(
+    os.getenv("UPSTREAM_CONCURRENCY_MAX", UPSTREAM_MAX_CONNECTIONS)
+)
+UPSTREAM_LATENCY_TARGET = float(os.getenv("UPSTREAM_LATENCY_TARGET", 2))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+UPSTREAM_RETRY_BASE = float(os.getenv("UPSTREAM_RETRY_BASE", 0.2))
+UPSTREAM_RETRY_CAP = float(os.getenv("UPSTREAM_RETRY_CAP", 2))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+
+# read-only dictionary snapshot written by snapshot.py, served before Mongo
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+
+# logging, set up in the application lifespan
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# background refresh of stored words older than WORD_FRESHNESS seconds, 0 disables it
+WORD_FRESHNESS = float(os.getenv("WORD_FRESHNESS", 30 * 24 * 3600))
+REFRESH_RATE = float(os.getenv("REFRESH_RATE", 1))
+REFRESH_QUEUE_SIZE = int(os.getenv("REFRESH_QUEUE_SIZE", 1000))
+
+# write-behind buffering of new words, inserted in batches by a background task
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_MAX_ITEMS = int(os.getenv("WRITE_BEHIND_MAX_ITEMS", 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", 5))
+
+# startup warm-up, done before the worker accepts connections
+WARMUP_PRELOAD = int(os.getenv("WARMUP_PRELOAD", 1000))
+WARMUP_SESSION_TOKENS = os.getenv("WARMUP_SESSION_TOKENS", "true").lower() == "true"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 10))
+
+# per-word hit counters, added to the "hits" field of stored words in batches
+POPULARITY_FLUSH_INTERVAL = float(os.getenv("POPULARITY_FLUSH_INTERVAL", 10))
+POPULARITY_MAX_KEYS = int(os.getenv("POPULARITY_MAX_KEYS", 10000))
+
+# GET /suggest/{prefix} autocomplete index
+SUGGEST_DEFAULT_LIMIT = int(os.getenv("SUGGEST_DEFAULT_LIMIT", 10))
+SUGGEST_MAX_LIMIT = int(os.getenv("SUGGEST_MAX_LIMIT", 100))
+# seconds between loads of the words other workers stored since the last one,
+# and between full rebuilds dropping the words they deleted
+SUGGEST_SYNC_INTERVAL = float(os.getenv("SUGGEST_SYNC_INTERVAL", 30))
+SUGGEST_REBUILD_INTERVAL = float(os.getenv("SUGGEST_REBUILD_INTERVAL", 3600))
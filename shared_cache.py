@@ -0,0 +1,223 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+MAGIC = b"TRWC0001"
+# magic, number of sets, ways per set, slot size
+HEADER = struct.Struct("<8sIII")
+# key hash (0 for a free slot), expiry time, last use time, key length, body length
+SLOT = struct.Struct("<QddHI")
+
+
+class SharedCacheError(ValueError):
+    """The cache file exists with another layout"""
+
+
+def _hash(value: bytes) -> int:
+    """Hash that is the same in every process, unlike hash()"""
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+class SharedWordCache:
+    """
+    Cache of ready-to-send word responses kept in a memory-mapped file shared
+    by all worker processes of a host, with the interface of WordCache.
+
+    The file is a set-associative table: every name maps to one set of ``ways``
+    fixed-size slots, so all languages of a word live in the same set and
+    DELETE /{word} can drop them from every worker at once. A full set evicts
+    its least recently used slot, bodies larger than a slot are not cached.
+    Sets are guarded by ``lock_shards`` fcntl byte-range locks, so workers only
+    wait for each other when they touch sets of the same shard.
+
+    The layout is part of the file name (``path`` followed by sets, ways and
+    slot size), so workers started with another configuration, for example
+    during a graceful reload, open a new file instead of resizing the one that
+    older workers still map. Hit and miss counters are per process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        slots: int,
+        slot_size: int,
+        ways: int,
+        ttl: float,
+        lock_shards: int = 64,
+    ):
+        self.ways = ways
+        self.sets = max(1, slots // ways)
+        self.path = f"{path}.{self.sets}x{ways}x{slot_size}"
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.lock_shards = lock_shards
+        self.max_bytes = slot_size - SLOT.size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        size = HEADER.size + self.sets * ways * slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = HEADER.pack(MAGIC, self.sets, ways, slot_size)
+        # the first worker sizes the file, the others find it ready. A file
+        # without a header was never mapped, any other file may be, so it is
+        # never resized
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            stored = os.pread(self._fd, HEADER.size, 0)
+            if not stored.strip(b"\0"):
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+                stored = header
+            matches = stored == header and os.fstat(self._fd).st_size == size
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+        if not matches:
+            os.close(self._fd)
+            raise SharedCacheError(
+                f"{self.path} is not a word cache of this layout, remove it once "
+                "no worker uses it"
+            )
+        self._map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _locked(self, set_index: int):
+        offset = 1 + set_index % self.lock_shards
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    def _set_index(self, name: str) -> int:
+        return _hash(name.encode("utf-8")) % self.sets
+
+    def _slots(self, set_index: int) -> Iterator[int]:
+        start = HEADER.size + set_index * self.ways * self.slot_size
+        return iter(range(start, start + self.ways * self.slot_size, self.slot_size))
+
+    @staticmethod
+    def _key(name: str, lang: Optional[str]) -> Tuple[bytes, int]:
+        key = name.encode("utf-8") + b"\0" + (lang or "").encode("utf-8")
+        return key, _hash(key) | 1
+
+    def _matches(self, offset: int, key: bytes, key_hash: int) -> bool:
+        stored_hash, _, _, key_length, _ = SLOT.unpack_from(self._map, offset)
+        start = offset + SLOT.size
+        return stored_hash == key_hash and self._map[start : start + key_length] == key
+
+    def _free(self, offset: int):
+        SLOT.pack_into(self._map, offset, 0, 0, 0, 0, 0)
+
+    def get(self, name: str, lang: Optional[str]) -> Optional[bytes]:
+        """Returns the cached body for the word or None"""
+        key, key_hash = self._key(name, lang)
+        set_index = self._set_index(name)
+        now = time.time()
+        with self._locked(set_index):
+            for offset in self._slots(set_index):
+                if not self._matches(offset, key, key_hash):
+                    continue
+                _, expires_at, _, key_length, body_length = SLOT.unpack_from(
+                    self._map, offset
+                )
+                if expires_at <= now:
+                    self._free(offset)
+                    self.expirations += 1
+                    break
+                SLOT.pack_into(
+                    self._map, offset, key_hash, expires_at, now, key_length, body_length
+                )
+                start = offset + SLOT.size + key_length
+                self.hits += 1
+                return self._map[start : start + body_length]
+        self.misses += 1
+        return None
+
+    def set(self, name: str, lang: Optional[str], body: bytes):
+        """Stores the body for the word, evicting the least recently used slot of its set"""
+        key, key_hash = self._key(name, lang)
+        if len(key) + len(body) > self.max_bytes:
+            return
+        set_index = self._set_index(name)
+        now = time.time()
+        with self._locked(set_index):
+            match = free = oldest = None
+            oldest_used = 0.0
+            for offset in self._slots(set_index):
+                if self._matches(offset, key, key_hash):
+                    match = offset
+                    break
+                stored_hash, expires_at, last_used, _, _ = SLOT.unpack_from(
+                    self._map, offset
+                )
+                if stored_hash == 0 or expires_at <= now:
+                    free = free or offset
+                elif oldest is None or last_used < oldest_used:
+                    oldest, oldest_used = offset, last_used
+            target = match or free
+            if target is None:
+                target = oldest
+                self.evictions += 1
+            self._free(target)
+            start = target + SLOT.size
+            self._map[start : start + len(key)] = key
+            self._map[start + len(key) : start + len(key) + len(body)] = body
+            SLOT.pack_into(
+                self._map, target, key_hash, now + self.ttl, now, len(key), len(body)
+            )
+
+    def invalidate(self, name: str, lang: Optional[str] = None):
+        """Removes the word in the given language, or in every language, for all workers"""
+        prefix = name.encode("utf-8") + b"\0"
+        key = self._key(name, lang)[0] if lang is not None else None
+        set_index = self._set_index(name)
+        with self._locked(set_index):
+            for offset in self._slots(set_index):
+                stored_hash, _, _, key_length, _ = SLOT.unpack_from(self._map, offset)
+                start = offset + SLOT.size
+                stored_key = self._map[start : start + key_length]
+                if stored_hash and (
+                    stored_key == key if key is not None else stored_key.startswith(prefix)
+                ):
+                    self._free(offset)
+
+    def clear(self):
+        """Removes every entry, keeping the counters"""
+        for set_index in range(self.sets):
+            with self._locked(set_index):
+                for offset in self._slots(set_index):
+                    self._free(offset)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns size and hit/miss/eviction counters of the cache"""
+        items = size = 0
+        now = time.time()
+        for set_index in range(self.sets):
+            for offset in self._slots(set_index):
+                stored_hash, expires_at, _, _, body_length = SLOT.unpack_from(
+                    self._map, offset
+                )
+                if stored_hash and expires_at > now:
+                    items += 1
+                    size += body_length
+        lookups = self.hits + self.misses
+        return {
+            "items": items,
+            "bytes": size,
+            "slots": self.sets * self.ways,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,291 @@
+"""
+Compiles the words collection into a read-only memory-mapped snapshot.
+
+    python snapshot.py words.snap
+
+The snapshot holds every word as a ready-to-send JSON body behind a sorted key
+index, so the service can answer lookups and prefix searches from the page
+cache (SNAPSHOT_PATH) and only fall back to Mongo for words missing from it.
+The file is written next to the target and renamed into place, workers that
+still map the previous snapshot keep reading it until they reopen.
+
+Words deleted while workers serve a snapshot are appended to a tombstone file
+next to it (TOMBSTONES_SUFFIX), one JSON string per line, which every worker
+reads before a lookup. A tombstone only sends lookups of the name to Mongo, so
+the file stays valid across re-exports and can be removed once no worker maps
+a snapshot exported before the deletions.
+
+Layout, little-endian:
+
+    header   magic (8 bytes), entry count (uint32)
+    index    per entry: key offset (uint64), key length (uint16),
+             _id length (uint16), record offset (uint64), record length (uint32)
+    keys     name, NUL, lang, then the _id, for every entry in key order
+    records  JSON bodies
+"""
+import os
+import json
+import mmap
+import struct
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from typing import List, Optional, Set, Tuple
+
+from database import create_client, get_words_collection, WORD_PROJECTION
+from serialization import dumps
+
+MAGIC = b"TRSNAP01"
+TOMBSTONES_SUFFIX = ".deleted"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<QHHQI")
+
+
+# marks the cursors of snapshot pages, which are keys rather than _ids
+CURSOR_PREFIX = "snap:"
+
+
+class SnapshotError(ValueError):
+    """The file is not a dictionary snapshot"""
+
+
+def snapshot_key(name: str, lang: Optional[str]) -> bytes:
+    """Sort key of a word; NUL keeps all languages of a name next to each other"""
+    return name.encode("utf-8") + b"\0" + (lang or "").encode("utf-8")
+
+
+def is_snapshot_cursor(cursor: str) -> bool:
+    """Tells a cursor returned by Snapshot.search from an _id cursor of Mongo"""
+    return cursor.startswith(CURSOR_PREFIX)
+
+
+async def export_snapshot(collection, path: str) -> int:
+    """
+    Writes the words of the collection to a snapshot file at ``path``.
+
+    Records are streamed to a temporary file while only the keys are kept in
+    memory for sorting.
+
+    Returns:
+        The number of exported words.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    entries = []
+    seen: Set[bytes] = set()
+    with tempfile.TemporaryFile(dir=directory) as records:
+        offset = 0
+        async for document in collection.find({}, WORD_PROJECTION):
+            key = snapshot_key(document["name"], document.get("lang"))
+            if key in seen:
+                continue
+            seen.add(key)
+            body = dumps(document)
+            records.write(body)
+            entries.append((key, str(document["_id"]).encode("utf-8"), offset, len(body)))
+            offset += len(body)
+        entries.sort()
+
+        keys_start = HEADER.size + ENTRY.size * len(entries)
+        records_start = keys_start + sum(len(key) + len(id_) for key, id_, _, _ in entries)
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".snap")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(entries)))
+                key_offset = keys_start
+                for key, id_, record_offset, length in entries:
+                    f.write(
+                        ENTRY.pack(
+                            key_offset,
+                            len(key),
+                            len(id_),
+                            records_start + record_offset,
+                            length,
+                        )
+                    )
+                    key_offset += len(key) + len(id_)
+                for key, id_, _, _ in entries:
+                    f.write(key + id_)
+                records.seek(0)
+                shutil.copyfileobj(records, f)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+    return len(entries)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file.
+
+    Lookups binary search the index in the mapping, nothing is copied into the
+    process except the bodies that are returned. Words deleted while the
+    snapshot is open are hidden with ``discard`` in every process serving it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise SnapshotError(f"{path} is not a dictionary snapshot")
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise SnapshotError(f"{path} is not a dictionary snapshot")
+        self._deleted: Set[str] = set()
+        # appends of a single line are atomic, so workers never see a partial one
+        self._tombstones = os.open(
+            path + TOMBSTONES_SUFFIX, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        self._tombstones_read = 0
+        self._load_tombstones()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_tombstones(self) -> None:
+        """Reads the names deleted by any worker since the previous call"""
+        size = os.fstat(self._tombstones).st_size
+        if size <= self._tombstones_read:
+            return
+        data = os.pread(
+            self._tombstones, size - self._tombstones_read, self._tombstones_read
+        )
+        # a line still being appended is read by the next call
+        data = data[: data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            self._deleted.add(json.loads(line))
+        self._tombstones_read += len(data)
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int, int]:
+        return ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * index)
+
+    def _key(self, index: int) -> bytes:
+        key_offset, key_length, _, _, _ = self._entry(index)
+        return self._map[key_offset : key_offset + key_length]
+
+    def _bisect(self, key: bytes) -> int:
+        """Index of the first entry whose key is not less than ``key``"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _record(self, record_offset: int, record_length: int) -> bytes:
+        return self._map[record_offset : record_offset + record_length]
+
+    def get(self, name: str, lang: Optional[str]) -> Optional[bytes]:
+        """Returns the JSON body of the word or None"""
+        self._load_tombstones()
+        key = snapshot_key(name, lang)
+        index = self._bisect(key)
+        if index < self.count and name not in self._deleted:
+            key_offset, key_length, _, record_offset, record_length = self._entry(index)
+            if self._map[key_offset : key_offset + key_length] == key:
+                self.hits += 1
+                return self._record(record_offset, record_length)
+        self.misses += 1
+        return None
+
+    def search(
+        self, prefix: str, limit: int, after: Optional[str] = None
+    ) -> Tuple[List[bytes], Optional[str]]:
+        """
+        Finds the words starting with ``prefix`` in key order, reading at most
+        ``limit`` + 1 entries past the deleted ones.
+
+        Args:
+            after: Cursor returned for the previous page.
+
+        Returns:
+            At most ``limit`` JSON bodies and the cursor of the next page, None
+            on the last page.
+
+        Raises:
+            ValueError: if ``after`` is not a snapshot cursor.
+        """
+        self._load_tombstones()
+        encoded = prefix.encode("utf-8")
+        start = self._bisect(encoded)
+        if after is not None:
+            if not is_snapshot_cursor(after):
+                raise ValueError(f"Invalid snapshot cursor {after}")
+            after_key = bytes.fromhex(after[len(CURSOR_PREFIX) :])
+            start = max(start, self._bisect(after_key + b"\0"))
+        page = []
+        for index in range(start, self.count):
+            key_offset, key_length, _, record_offset, record_length = self._entry(index)
+            key = self._map[key_offset : key_offset + key_length]
+            if not key.startswith(encoded):
+                break
+            if key[: key.index(b"\0")].decode("utf-8") in self._deleted:
+                continue
+            if len(page) == limit:
+                return page, CURSOR_PREFIX + last_key.hex()
+            page.append(self._record(record_offset, record_length))
+            last_key = key
+        return page, None
+
+    def discard(self, name: str) -> bool:
+        """
+        Hides all languages of a deleted word from every worker.
+
+        Returns:
+            True if the snapshot served the word until now.
+        """
+        self._load_tombstones()
+        if name in self._deleted:
+            return False
+        key = snapshot_key(name, None)
+        index = self._bisect(key)
+        if index == self.count or not self._key(index).startswith(key):
+            return False
+        os.write(self._tombstones, json.dumps(name).encode("utf-8") + b"\n")
+        self._deleted.add(name)
+        return True
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._tombstones)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self.count,
+            "deleted": len(self._deleted),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+async def export(args: argparse.Namespace) -> int:
+    """Runs the export described by the command-line arguments"""
+    client = create_client()
+    try:
+        count = await export_snapshot(get_words_collection(client), args.path)
+    finally:
+        client.close()
+    logging.info("%d words written to %s", count, args.path)
+    return count
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compile the words collection into a snapshot file"
+    )
+    parser.add_argument("path", help="snapshot file to write")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(export(parse_args()))
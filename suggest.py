@@ -0,0 +1,175 @@
+import asyncio
+import bisect
+import datetime
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from database import WORD_KEY
+
+# documents written shortly before a sync may become visible after it
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def _insert(names: List[str], name: str) -> None:
+    index = bisect.bisect_left(names, name)
+    if index == len(names) or names[index] != name:
+        names.insert(index, name)
+
+
+def _remove(names: List[str], name: str) -> None:
+    index = bisect.bisect_left(names, name)
+    if index < len(names) and names[index] == name:
+        del names[index]
+
+
+class SuggestIndex:
+    """
+    In-memory autocomplete index of the stored word names.
+
+    Names are kept in one sorted array and in a sorted array per language,
+    sharing the same string objects, so the names starting with a prefix are
+    found with a binary search and a slice of ``limit`` names, with or without
+    a language filter.
+
+    The index is built from the collection at startup and updated by this
+    worker's inserts and deletes. Every ``sync_interval`` seconds it adds the
+    words fetched since the previous sync, to pick up other workers' inserts;
+    every ``rebuild_interval`` seconds it is built again, to drop their
+    deletes. Changes made while a build runs are applied to the new index.
+    """
+
+    def __init__(self, sync_interval: float, rebuild_interval: float, collection=None):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.collection = collection
+        self._names: List[str] = []
+        self._langs: Dict[Optional[str], List[str]] = {}
+        self._journal: Optional[List[Tuple[str, Union[Optional[str], Set]]]] = None
+        self._synced_at: Optional[datetime.datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str, lang: Optional[str]) -> None:
+        if self._journal is not None:
+            self._journal.append((name, lang))
+        self._add(name, lang)
+
+    def set_langs(self, name: str, langs: Set[Optional[str]]) -> None:
+        """Replaces the languages of a name, removing it when there are none"""
+        if self._journal is not None:
+            self._journal.append((name, set(langs)))
+        self._set_langs(name, langs)
+
+    def _add(self, name: str, lang: Optional[str]) -> None:
+        index = bisect.bisect_left(self._names, name)
+        if index < len(self._names) and self._names[index] == name:
+            # share the stored string instead of keeping a copy per language
+            name = self._names[index]
+        else:
+            self._names.insert(index, name)
+        _insert(self._langs.setdefault(lang, []), name)
+
+    def _set_langs(self, name: str, langs: Set[Optional[str]]) -> None:
+        for lang, names in self._langs.items():
+            if lang not in langs:
+                _remove(names, name)
+        if not langs:
+            _remove(self._names, name)
+        for lang in langs:
+            self._add(name, lang)
+
+    def suggest(self, prefix: str, limit: int, lang: Optional[str] = None) -> List[str]:
+        """Returns at most ``limit`` names starting with ``prefix`` in alphabetical order"""
+        names = self._names if lang is None else self._langs.get(lang, [])
+        start = bisect.bisect_left(names, prefix)
+        suggestions = []
+        for name in names[start : start + limit]:
+            if not name.startswith(prefix):
+                break
+            suggestions.append(name)
+        return suggestions
+
+    async def build(self) -> int:
+        """
+        Loads the names of all stored words, in (name, lang) index order.
+
+        Returns:
+            The number of distinct names.
+        """
+        started = datetime.datetime.utcnow()
+        names: List[str] = []
+        langs: Dict[Optional[str], List[str]] = {}
+        self._journal = []
+        try:
+            words = self.collection.find({}, {"_id": 0, "name": 1, "lang": 1})
+            async for document in words.sort(WORD_KEY):
+                name = document["name"]
+                if names and names[-1] == name:
+                    name = names[-1]
+                else:
+                    names.append(name)
+                langs.setdefault(document.get("lang"), []).append(name)
+        finally:
+            journal, self._journal = self._journal, None
+        self._names, self._langs = names, langs
+        # replay the changes made by this worker while the words were read
+        for name, change in journal:
+            if isinstance(change, set):
+                self._set_langs(name, change)
+            else:
+                self._add(name, change)
+        self._synced_at = started
+        return len(self._names)
+
+    async def sync(self) -> int:
+        """
+        Adds the words fetched since the previous build or sync.
+
+        Returns:
+            The number of read words.
+        """
+        if self._synced_at is None:
+            return await self.build()
+        started = datetime.datetime.utcnow()
+        count = 0
+        words = self.collection.find(
+            {"fetched_at": {"$gte": self._synced_at - SYNC_OVERLAP}},
+            {"_id": 0, "name": 1, "lang": 1},
+        )
+        async for document in words:
+            self._add(document["name"], document.get("lang"))
+            count += 1
+        self._synced_at = started
+        return count
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        rebuild_at = loop.time() + self.rebuild_interval
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                if self.rebuild_interval > 0 and loop.time() >= rebuild_at:
+                    await self.build()
+                    rebuild_at = loop.time() + self.rebuild_interval
+                else:
+                    await self.sync()
+            except Exception as e:
+                logging.warning("Failed to update the suggest index: %s", e)
+
+    def start(self):
+        if self.sync_interval > 0:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"names": len(self._names), "langs": len(self._langs)}
@@ -1,22 +1,130 @@
+import io
+import asyncio
+import json
+import datetime
+import urllib.parse
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from bson.objectid import ObjectId
-from unittest.mock import patch, MagicMock
-from main import app, db
+from unittest.mock import patch, AsyncMock, MagicMock
+from main import app, word_cache, negative_cache
+import api_requests
+import batchexecute
+import metrics
+import prewarm
+from metrics import Histogram
+from api_requests import APIRequests, TokenCache, UpstreamUnavailableError
+from governor import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    UpstreamGovernor,
+)
+from database import WORD_PROJECTION
+from models import WordModel
+from singleflight import SingleFlight
+from refresher import Refresher
+from warmup import WarmUp
+from cache import WordCache, NegativeCache
+from search import build_query, ngrams
 from translate_handler import TranslateHandler
 
 
+def make_governor(failure_threshold=5, reset_timeout=60, retries=0):
+    """Upstream governor without rate limit and retry delays"""
+    return UpstreamGovernor(
+        bucket=TokenBucket(rate=0, burst=1),
+        limiter=AdaptiveLimiter(initial=4, min_limit=1, max_limit=8, latency_target=1),
+        breaker=CircuitBreaker(
+            failure_threshold=failure_threshold, reset_timeout=reset_timeout
+        ),
+        retries=retries,
+        retry_base=0,
+        retry_cap=0,
+        retryable=(UpstreamUnavailableError,),
+    )
+
+
+def mock_collection():
+    """Collection whose Motor methods are async mocks"""
+    collection = MagicMock()
+    for method in (
+        "find_one",
+        "find_one_and_update",
+        "insert_one",
+        "insert_many",
+        "delete_one",
+        "bulk_write",
+        "create_index",
+        "distinct",
+    ):
+        setattr(collection, method, AsyncMock())
+    collection.find_one.return_value = None
+    collection.find_one_and_update.return_value = None
+    collection.find.side_effect = lambda *args, **kwargs: AsyncCursor([])
+    return collection
+
+
 @pytest.fixture(scope="module")
-def test_client():
-    with TestClient(app) as client:
+def test_client(tmp_path_factory):
+    # stored test documents have no fetched_at, keep them from being refreshed
+    log_file = str(tmp_path_factory.mktemp("logs") / "app.log")
+    with patch("main.create_client"), patch("main.LOG_FILE", log_file), patch(
+        "main.get_words_collection", return_value=mock_collection()
+    ), patch("main.refresher.freshness", 0), patch(
+        "main.warmup.session_tokens", False
+    ), TestClient(
+        app
+    ) as client:
         yield client
 
 
-def test_create_word_success(test_client):
+@pytest.fixture(autouse=True)
+def clear_word_cache():
+    word_cache.clear()
+    negative_cache.clear()
+
+
+class AsyncCursor:
+    """Stand-in for a Motor cursor over a list of documents"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.documents:
+            raise StopAsyncIteration
+        return self.documents.pop(0)
+
+    async def to_list(self, length):
+        length = length or len(self.documents)
+        documents, self.documents = self.documents[:length], self.documents[length:]
+        return documents
+
+
+@pytest.fixture
+def db(test_client):
+    with patch("main.db", mock_collection()) as collection:
+        yield collection
+
+
+def test_create_word_success(test_client, db):
     word_input = {"word": "test", "lang": "en"}
-    object_id = ObjectId()
     with patch.object(db, "find_one", return_value=None), patch.object(
-        db, "insert_one", return_value=MagicMock(inserted_id=str(object_id))
+        db, "find_one_and_update", return_value=None
     ), patch.object(
         TranslateHandler,
         "get_translation_info",
@@ -172,10 +280,20 @@ def test_create_word_success(test_client):
     ):
         response = test_client.post("/translate_word", json=word_input)
         assert response.status_code == 201
-        assert response.json() == None
+        created_word = response.json()
+        assert created_word["name"] == "test"
+        assert created_word["lang"] == "en"
+        assert (
+            created_word["examples"][0]
+            == "such behavior would severely test any marriage"
+        )
+        assert "grams" not in created_word
+        stored_word = db.find_one_and_update.call_args[0][1]["$setOnInsert"]
+        assert stored_word["_id"] == created_word["_id"]
+        db.insert_one.assert_not_called()
 
 
-def test_create_word_existing_translation(test_client):
+def test_create_word_existing_translation(test_client, db):
     word_input = {"word": "test", "lang": "en"}
     object_id = ObjectId()
     with patch.object(
@@ -196,7 +314,7 @@ def test_create_word_existing_translation(test_client):
         }
 
 
-def test_create_word_not_found(test_client):
+def test_create_word_not_found(test_client, db):
     word_input = {"word": "not_found", "lang": "en"}
     with patch.object(db, "find_one", return_value=None), patch.object(
         TranslateHandler, "get_translation_info", return_value=[]
@@ -206,22 +324,24 @@ def test_create_word_not_found(test_client):
         assert response.json() == {"detail": "No translation found. Please, check word"}
 
 
-def test_show_word(test_client):
+def test_show_word(test_client, db):
     object_id = ObjectId()
     with patch.object(
         db,
         "find",
-        return_value=[
-            {
-                "_id": object_id,
-                "lang": "test_lang",
-                "synonyms": [],
-                "translations": [],
-                "examples": [],
-                "definitions": [],
-                "name": "test_word",
-            }
-        ],
+        return_value=AsyncCursor(
+            [
+                {
+                    "_id": object_id,
+                    "lang": "test_lang",
+                    "synonyms": [],
+                    "translations": [],
+                    "examples": [],
+                    "definitions": [],
+                    "name": "test_word",
+                }
+            ]
+        ),
     ):
         response = test_client.get("/test")
         assert response.status_code == 200
@@ -238,14 +358,1454 @@ def test_show_word(test_client):
         ]
 
 
-def test_delete_word_success(test_client):
+def test_delete_word_success(test_client, db):
     with patch.object(db, "delete_one", return_value=MagicMock(deleted_count=1)):
         response = test_client.delete("/test_word")
         assert response.status_code == 204
 
 
-def test_delete_word_not_found(test_client):
+def test_delete_word_not_found(test_client, db):
     with patch.object(db, "delete_one", return_value=MagicMock(deleted_count=0)):
         response = test_client.delete("/not_found")
         assert response.status_code == 404
         assert response.json() == {"detail": "Word not_found not found"}
+
+
+def google_transport(requests, token_sids=("sid",)):
+    """MockTransport serving the translate page and a batchexecute frame"""
+    sids = iter(token_sids)
+    frame = json.dumps([["wrb.fr", "MkEWBc", json.dumps([None, None, "en"])]])
+
+    def handler(request):
+        requests.append(request)
+        if request.method == "GET":
+            return httpx.Response(
+                200, text=f'"MkEWBc":"rpc","FdrFJe":"{next(sids)}","cfb2h":"bl"'
+            )
+        if "f.sid=expired" in str(request.url):
+            return httpx.Response(400)
+        return httpx.Response(200, text=")]}'\n\n" + f"{len(frame) + 1}\n{frame}\n")
+
+    return httpx.MockTransport(handler)
+
+
+def test_api_requests_reuse_pooled_client():
+    seen = []
+
+    async def translate():
+        async with httpx.AsyncClient(transport=google_transport(seen)) as client:
+            api_requests = APIRequests(client=client)
+            tokens = await api_requests.get_session_tokens()
+            return await api_requests.fetch_translation(
+                tokens=tokens, word="test", target_lang="en"
+            )
+
+    with patch("api_requests.session_tokens", TokenCache()):
+        assert asyncio.run(translate()) == [None, None, "en"]
+    assert [request.method for request in seen] == ["GET", "POST"]
+    assert "f.sid=sid" in str(seen[1].url)
+
+
+def test_session_tokens_cached_and_refreshed_on_failure():
+    seen = []
+
+    async def translate_twice():
+        async with httpx.AsyncClient(
+            transport=google_transport(seen, token_sids=("expired", "fresh"))
+        ) as client:
+            with patch("translate_handler.APIRequests", lambda: APIRequests(client)):
+                handler = TranslateHandler()
+                await handler.get_translation_info(word="first", lang="en")
+                await handler.get_translation_info(word="second", lang="en")
+
+    with patch("api_requests.session_tokens", TokenCache()):
+        asyncio.run(translate_twice())
+    assert [request.method for request in seen] == [
+        "GET",
+        "POST",
+        "GET",
+        "POST",
+        "POST",
+    ]
+    assert "f.sid=fresh" in str(seen[-1].url)
+
+
+def test_batch_failures_are_reported_per_word(test_client, db):
+    seen = []
+    sids = iter(["first", "second"])
+    frame = json.dumps([["wrb.fr", "MkEWBc", json.dumps([None, None, "en"])]])
+
+    def handler(request):
+        if request.method == "GET":
+            seen.append("GET")
+            return httpx.Response(
+                200, text=f'"MkEWBc":"rpc","FdrFJe":"{next(sids)}","cfb2h":"bl"'
+            )
+        word = json.loads(
+            json.loads(urllib.parse.unquote(request.content.decode())[6:-1])[0][0][1]
+        )[0][0]
+        seen.append(word)
+        if word == "stale" and "f.sid=first" in str(request.url):
+            return httpx.Response(400)
+        if word == "down":
+            return httpx.Response(503)
+        if word == "none":
+            return httpx.Response(200, text=")]}'\n\n" + '9\n[["di"]]\n')
+        return httpx.Response(200, text=")]}'\n\n" + f"{len(frame) + 1}\n{frame}\n")
+
+    async def post(client):
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        ) as upstream:
+            with patch("translate_handler.APIRequests", lambda: APIRequests(upstream)):
+                return await client.post(
+                    "/translate_words",
+                    json=[
+                        {"word": w, "lang": "de"}
+                        for w in ["ok", "stale", "down", "none"]
+                    ],
+                )
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await post(client)
+
+    db.find.side_effect = lambda *args: AsyncCursor([])
+    with patch("api_requests.session_tokens", TokenCache()), patch(
+        "api_requests.upstream_governor", make_governor(failure_threshold=10)
+    ), patch("translate_handler.BATCH_MAX_RPCS", 1), patch.object(
+        TranslateHandler,
+        "build_word_model",
+        lambda self, word, lang, raw_object: WordModel(
+            name=word,
+            lang=lang,
+            translations=[word],
+            synonyms=[],
+            definitions=[],
+            examples=[],
+        ),
+    ):
+        response = asyncio.run(run())
+    assert [r["status_code"] for r in response.json()] == [201, 201, 502, 502]
+    # only the request rejected for stale tokens is sent again
+    assert sorted(seen) == sorted(
+        ["GET", "ok", "stale", "down", "none", "GET", "stale"]
+    )
+    assert not negative_cache.stats()["items"]
+
+
+def test_missing_result_does_not_refresh_tokens():
+    from api_requests import MissingResultError
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        if request.method == "GET":
+            return httpx.Response(
+                200, text='"MkEWBc":"rpc","FdrFJe":"sid","cfb2h":"bl"'
+            )
+        return httpx.Response(200, text=")]}'\n\n" + '9\n[["di"]]\n')
+
+    async def translate():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with patch("translate_handler.APIRequests", lambda: APIRequests(client)):
+                await TranslateHandler().get_translation_info(word="word", lang="de")
+
+    with patch("api_requests.session_tokens", TokenCache()), pytest.raises(
+        MissingResultError
+    ):
+        asyncio.run(translate())
+    assert seen == ["GET", "POST"]
+
+
+def test_batchexecute_matches_results_by_tag():
+    words = [("one", "de"), ("two", "fr")]
+    payload = batchexecute.build_payload(words)
+    assert payload.count("MkEWBc") == 2
+    frame = json.dumps(
+        [
+            ["wrb.fr", "MkEWBc", json.dumps(["two"]), None, None, None, "2"],
+            ["wrb.fr", "MkEWBc", json.dumps(["one"]), None, None, None, "1"],
+            ["di", 42],
+        ]
+    )
+    body = ")]}'\n\n" + f"{len(frame) + 1}\n{frame}\n" + '6\n["e"]\n'
+    frames = batchexecute.parse_response(body)
+    assert batchexecute.extract_results(frames, len(words)) == [["one"], ["two"]]
+
+
+def test_create_words_batch(test_client, db):
+    object_id = ObjectId()
+    cached = {
+        "_id": object_id,
+        "lang": "de",
+        "name": "cached",
+        "synonyms": [],
+        "translations": ["gespeichert"],
+        "examples": [],
+        "definitions": [],
+    }
+    translated = [
+        WordModel(
+            name="new",
+            lang="de",
+            translations=["neu"],
+            synonyms=[],
+            definitions=[],
+            examples=[],
+        ),
+        WordModel(
+            name="qwzx",
+            lang="de",
+            translations=[],
+            synonyms=[],
+            definitions=[],
+            examples=[],
+        ),
+    ]
+    with patch.object(
+        db, "find", return_value=AsyncCursor([cached])
+    ) as find, patch.object(db, "insert_many") as insert_many, patch.object(
+        TranslateHandler, "get_translation_objs", return_value=translated
+    ) as get_translation_objs:
+        response = test_client.post(
+            "/translate_words",
+            json=[
+                {"word": "cached", "lang": "de"},
+                {"word": "new", "lang": "de"},
+                {"word": "qwzx", "lang": "de"},
+                {"word": "new", "lang": "de"},
+            ],
+        )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status_code"] for result in results] == [200, 201, 404, 201]
+    assert results[0]["translation"]["_id"] == str(object_id)
+    assert results[1]["translation"]["translations"] == ["neu"]
+    assert find.call_count == 1
+    get_translation_objs.assert_called_once_with([("new", "de"), ("qwzx", "de")])
+    assert [w["name"] for w in insert_many.call_args[0][0]] == ["new"]
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls = []
+
+    async def get_translation_info(self, word, lang):
+        calls.append((word, lang))
+        await asyncio.sleep(0.01)
+        return []
+
+    async def translate_concurrently():
+        handler = TranslateHandler()
+        return await asyncio.gather(
+            *(handler.get_translation_obj(word="hot", lang="de") for _ in range(5)),
+            handler.get_translation_obj(word="hot", lang="fr"),
+        )
+
+    flights = SingleFlight()
+    with patch("translate_handler.translation_flights", flights), patch.object(
+        TranslateHandler, "get_translation_info", get_translation_info
+    ):
+        results = asyncio.run(translate_concurrently())
+    assert calls == [("hot", "de"), ("hot", "fr")]
+    assert results[0] is results[4]
+    assert flights.stats() == {"calls": 2, "coalesced": 4, "in_flight": 0}
+
+
+def test_create_word_served_from_cache_until_deleted(test_client, db):
+    word_input = {"word": "cached", "lang": "de"}
+    document = {"_id": str(ObjectId()), "name": "cached", "lang": "de"}
+    with patch.object(db, "find_one", return_value=document) as find_one:
+        assert test_client.post("/translate_word", json=word_input).json() == document
+        assert test_client.post("/translate_word", json=word_input).json() == document
+        assert find_one.call_count == 1
+        with patch.object(db, "delete_one", return_value=MagicMock(deleted_count=1)):
+            test_client.delete("/cached")
+        test_client.post("/translate_word", json=word_input)
+        assert find_one.call_count == 2
+
+
+def test_word_cache_evicts_least_recently_used():
+    cache = WordCache(max_items=2, max_bytes=10, ttl=60)
+    cache.set("a", "de", b"1234")
+    cache.set("b", "de", b"1234")
+    assert cache.get("a", "de") == b"1234"
+    cache.set("c", "de", b"1234")
+    assert cache.get("b", "de") is None
+    cache.set("d", "de", b"123456")
+    assert cache.get("a", "de") is None
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["bytes"] == 10
+
+
+def test_search_queries_use_ngram_index():
+    assert ngrams("test") == ["t", "e", "s", "te", "es", "st", "tes", "est"]
+    assert build_query("es") == {"grams": "es"}
+    assert build_query("a.b*") == {
+        "grams": {"$all": ["a.b", ".b*"]},
+        "name": {"$regex": "a\\.b\\*"},
+    }
+    assert build_query("a.b", mode="prefix") == {"name": {"$regex": "^a\\.b"}}
+
+
+def test_show_word_prefix_mode(test_client, db):
+    response = test_client.get("/tes", params={"mode": "prefix"})
+    assert response.status_code == 200
+    assert db.find.call_args[0] == ({"name": {"$regex": "^tes"}}, WORD_PROJECTION)
+    assert test_client.get("/tes", params={"mode": "fuzzy"}).status_code == 422
+
+
+def test_create_word_stores_search_grams(test_client, db):
+    word = WordModel(
+        name="ab",
+        lang="de",
+        translations=["ab"],
+        synonyms=[],
+        definitions=[],
+        examples=[],
+    )
+    with patch.object(TranslateHandler, "get_translation_obj", return_value=word):
+        test_client.post("/translate_word", json={"word": "ab", "lang": "de"})
+    assert db.find_one_and_update.call_args[0][1]["$setOnInsert"]["grams"] == [
+        "a",
+        "b",
+        "ab",
+    ]
+
+
+def test_show_word_paginates_with_cursor(test_client, db):
+    documents = [{"_id": str(ObjectId()), "name": f"test{i}"} for i in range(3)]
+    db.find.side_effect = lambda *args: AsyncCursor(list(documents))
+    response = test_client.get("/test", params={"limit": 2, "fields": "name"})
+    assert response.json() == documents[:2]
+    assert response.headers["X-Next-Cursor"] == documents[1]["_id"]
+    query, projection = db.find.call_args[0]
+    assert projection == {"name": 1}
+
+    response = test_client.get("/test", params={"after": documents[1]["_id"]})
+    assert "X-Next-Cursor" not in response.headers
+    assert db.find.call_args[0][0]["_id"] == {"$gt": documents[1]["_id"]}
+    assert test_client.get("/test", params={"fields": "grams"}).status_code == 400
+
+
+def test_show_word_streams_ndjson(test_client, db):
+    documents = [{"_id": str(ObjectId()), "name": f"test{i}"} for i in range(3)]
+    db.find.side_effect = lambda *args: AsyncCursor(list(documents))
+    response = test_client.get("/test", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == documents
+
+
+def test_search_counts_only_the_exact_name_as_a_hit(test_client, db):
+    documents = [
+        {"_id": "1", "name": "app", "lang": "de"},
+        {"_id": "2", "name": "apple", "lang": "de"},
+    ]
+    db.find.side_effect = lambda *args: AsyncCursor(list(documents))
+    with patch("main.popularity.hit") as hit:
+        test_client.get("/app", params={"mode": "prefix"})
+        test_client.get("/ap", params={"mode": "prefix"})
+        test_client.get("/app", params={"format": "ndjson"})
+        db.find.side_effect = lambda *args: AsyncCursor([{"_id": "1", "name": "app"}])
+        test_client.get("/app", params={"mode": "prefix", "fields": "name"})
+    assert hit.call_args_list == [(("app", "de"),), (("app", "de"),)]
+
+
+def test_create_word_returns_concurrently_stored_word(test_client, db):
+    stored = {"_id": str(ObjectId()), "name": "race", "lang": "de"}
+    word = WordModel(
+        name="race",
+        lang="de",
+        translations=["Rennen"],
+        synonyms=[],
+        definitions=[],
+        examples=[],
+    )
+    with patch.object(db, "find_one_and_update", return_value=stored), patch.object(
+        TranslateHandler, "get_translation_obj", return_value=word
+    ):
+        response = test_client.post(
+            "/translate_word", json={"word": "race", "lang": "de"}
+        )
+    assert response.status_code == 200
+    assert response.json() == stored
+
+
+def test_words_without_translation_are_negatively_cached(test_client, db):
+    word_input = {"word": "qwzx", "lang": "de"}
+    with patch.object(
+        TranslateHandler, "get_translation_info", return_value=[]
+    ) as get_translation_info, patch("main.popularity.hit") as hit:
+        assert test_client.post("/translate_word", json=word_input).status_code == 404
+        assert test_client.post("/translate_word", json=word_input).status_code == 404
+    assert get_translation_info.call_count == 1
+    assert negative_cache.stats()["hits"] == 1
+    # missing words are not counted as lookups
+    hit.assert_not_called()
+
+
+def test_negative_cache_shared_through_mongo():
+    collection = mock_collection()
+    collection.update_one = AsyncMock()
+    first, second = (
+        NegativeCache(max_items=10, ttl=60, collection=collection) for _ in range(2)
+    )
+
+    async def check():
+        await first.add("qwzx", "de")
+        collection.find_one.return_value = {"_id": "id"}
+        return await second.contains("qwzx", "de")
+
+    assert asyncio.run(check())
+    assert collection.update_one.call_args[0][0] == {"name": "qwzx", "lang": "de"}
+    assert second.stats()["mongo_hits"] == 1
+
+
+def test_frame_decoder_yields_frames_as_they_arrive():
+    first = json.dumps(
+        [["wrb.fr", "MkEWBc", json.dumps(["one"]), None, None, None, "1"]]
+    )
+    second = json.dumps(
+        [["wrb.fr", "MkEWBc", json.dumps(["two"]), None, None, None, "2"]]
+    )
+    body = ")]}'\n\n" + f"{len(first) + 1}\n{first}\n{len(second) + 1}\n{second}\n"
+    decoder = batchexecute.FrameDecoder()
+    matcher = batchexecute.ResultMatcher(2)
+    received = []
+    for position, char in enumerate(body):
+        for frame in decoder.feed(char):
+            received.extend((position, result) for result in matcher.match(frame))
+    decoder.close()
+    assert [result for _, result in received] == [(0, ["one"]), (1, ["two"])]
+    assert received[0][0] < len(body) - len(second)
+
+
+@pytest.mark.parametrize(
+    "body",
+    ["<html>captcha</html>", ")]}'\n\nabc\n[]", ")]}'\n\n5\n[1,\n", ")]}'\n\n99\n[[]]"],
+)
+def test_frame_decoder_rejects_malformed_responses(body):
+    with pytest.raises(batchexecute.BatchExecuteError):
+        batchexecute.parse_response(body)
+
+
+def test_prewarm_reads_chunks_after_saved_line():
+    lines = io.StringIO("one\n\n# comment\ntwo\nthree\nfour\n")
+    assert list(prewarm.read_chunks(lines, chunk_size=2)) == [
+        (4, ["one", "two"]),
+        (6, ["three", "four"]),
+    ]
+    lines.seek(0)
+    assert list(prewarm.read_chunks(lines, chunk_size=2, skip=4)) == [
+        (6, ["three", "four"])
+    ]
+
+
+def test_prewarm_translates_only_missing_words():
+    collection = mock_collection()
+    collection.find.side_effect = lambda *args: AsyncCursor(
+        [{"name": "one", "lang": "de"}]
+    )
+    collection.insert_many.return_value = MagicMock(inserted_ids=["id"])
+
+    async def get_translation_objs(self, words):
+        return [
+            WordModel(
+                name=word,
+                lang=lang,
+                translations=[] if word == "qwzx" else [word],
+                synonyms=[],
+                definitions=[],
+                examples=[],
+            )
+            for word, lang in words
+        ]
+
+    async def process():
+        prewarmer = prewarm.Prewarmer(collection, langs=["de", "fr"], concurrency=2)
+        await prewarmer.process(["one", "qwzx", "one"])
+        return prewarmer
+
+    with patch.object(TranslateHandler, "get_translation_objs", get_translation_objs):
+        prewarmer = asyncio.run(process())
+    inserted = collection.insert_many.call_args[0][0]
+    assert [(doc["name"], doc["lang"]) for doc in inserted] == [("one", "fr")]
+    assert (prewarmer.stored, prewarmer.inserted, prewarmer.not_found) == (1, 1, 2)
+
+
+def test_prewarm_state_stops_before_failed_chunk(tmp_path):
+    wordlist = tmp_path / "words.txt"
+    wordlist.write_text("one\nbad\ntwo\n")
+    state = tmp_path / "state"
+    collection = mock_collection()
+    collection.insert_many.return_value = MagicMock(inserted_ids=["id"])
+
+    async def get_translation_objs(self, words):
+        if words[0][0] == "bad":
+            raise api_requests.UpstreamError("rejected")
+        return [
+            WordModel(
+                name=word,
+                lang=lang,
+                translations=[word],
+                synonyms=[],
+                definitions=[],
+                examples=[],
+            )
+            for word, lang in words
+        ]
+
+    args = prewarm.parse_args(
+        [str(wordlist), "--lang", "de", "--chunk-size", "1", "--state", str(state)]
+    )
+    with patch.object(
+        TranslateHandler, "get_translation_objs", get_translation_objs
+    ), patch("prewarm.create_client"), patch(
+        "prewarm.get_words_collection", return_value=collection
+    ), patch(
+        "prewarm.ensure_indexes", AsyncMock()
+    ):
+        prewarmer = asyncio.run(prewarm.prewarm(args))
+    assert (prewarmer.inserted, prewarmer.failed) == (2, 1)
+    assert prewarm.load_state(str(state)) == 1
+
+
+def test_prewarm_stops_when_circuit_opens(tmp_path):
+    wordlist = tmp_path / "words.txt"
+    wordlist.write_text("one\nbad\ntwo\n")
+    state = tmp_path / "state"
+    collection = mock_collection()
+    collection.insert_many.return_value = MagicMock(inserted_ids=["id"])
+    translated = []
+
+    async def get_translation_objs(self, words):
+        translated.extend(word for word, _ in words)
+        if words[0][0] == "bad":
+            return [CircuitOpenError("open")]
+        return [
+            WordModel(
+                name=word,
+                lang=lang,
+                translations=[word],
+                synonyms=[],
+                definitions=[],
+                examples=[],
+            )
+            for word, lang in words
+        ]
+
+    args = prewarm.parse_args(
+        [str(wordlist), "--lang", "de", "--chunk-size", "1", "--state", str(state)]
+    )
+    with patch.object(
+        TranslateHandler, "get_translation_objs", get_translation_objs
+    ), patch("prewarm.create_client"), patch(
+        "prewarm.get_words_collection", return_value=collection
+    ), patch(
+        "prewarm.ensure_indexes", AsyncMock()
+    ), patch(
+        "prewarm.close_client", AsyncMock()
+    ) as close_client:
+        prewarmer = asyncio.run(prewarm.prewarm(args))
+    assert translated == ["one", "bad"]
+    assert prewarmer.inserted == 1
+    assert prewarm.load_state(str(state)) == 1
+    close_client.assert_awaited_once()
+
+
+def test_word_index_migration_runs_outside_startup():
+    from pymongo.errors import OperationFailure
+    from database import WORD_KEY, ensure_indexes, migrate_word_index
+
+    collection = mock_collection()
+    collection.delete_many = AsyncMock()
+    collection.create_index.side_effect = [
+        OperationFailure("duplicates", code=11000),
+        None,
+        None,
+        None,
+    ]
+    asyncio.run(ensure_indexes(collection))
+    collection.delete_many.assert_not_called()
+
+    # another worker dropped the old index first
+    collection.create_index.side_effect = [OperationFailure("conflict", code=85), None]
+    collection.drop_index = AsyncMock(
+        side_effect=OperationFailure("not found", code=27)
+    )
+    assert asyncio.run(migrate_word_index(collection)) == 0
+    assert collection.create_index.call_args == ((WORD_KEY,), {"unique": True})
+
+
+def test_migrate_backfills_search_field():
+    import migrate
+    from benchmarks.fake_mongo import FakeCollection
+
+    collection = FakeCollection("words")
+    asyncio.run(collection.insert_one({"_id": "1", "name": "old", "lang": "de"}))
+    with patch("migrate.create_client"), patch(
+        "migrate.get_words_collection", return_value=collection
+    ):
+        assert asyncio.run(migrate.migrate(migrate.parse_args([]))) == 0
+    assert asyncio.run(collection.find_one({"_id": "1"}))["grams"] == ngrams("old")
+
+
+def test_governor_retries_then_opens_circuit():
+    statuses = iter([503, 200, 503, 503, 503])
+
+    def handler(request):
+        return httpx.Response(next(statuses), text="page")
+
+    governor = make_governor(failure_threshold=2, retries=1)
+
+    async def get_pages():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api_requests = APIRequests(client=client)
+            assert await api_requests.get_google_translate_page() == "page"
+            with pytest.raises(UpstreamUnavailableError):
+                await api_requests.get_google_translate_page()
+            with pytest.raises(CircuitOpenError):
+                await api_requests.get_google_translate_page()
+
+    with patch("api_requests.upstream_governor", governor):
+        asyncio.run(get_pages())
+    assert governor.stats()["retried"] == 2
+    assert governor.stats()["breaker"] == "open"
+    assert governor.stats()["rejected"] == 1
+    assert governor.limiter.limit < 4
+
+
+def test_circuit_breaker_survives_cancelled_trial_and_late_calls():
+    governor = make_governor(failure_threshold=1, reset_timeout=0)
+    breaker = governor.breaker
+
+    async def call(fail=False):
+        async with governor.slot():
+            if fail:
+                raise UpstreamUnavailableError()
+
+    async def run():
+        # a slow call admitted while the breaker is closed
+        late = governor.slot()
+        await late.__aenter__()
+        with pytest.raises(UpstreamUnavailableError):
+            await call(fail=True)
+        assert breaker.state == "open"
+        await late.__aexit__(None, None, None)
+        assert breaker.state == "open"
+
+        # the trial is cancelled while it waits for the rate limit
+        governor.bucket.rate, governor.bucket.tokens = 0.5, 0
+        trial = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        governor.bucket.rate = 0
+        await call()
+        assert breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_throttling_does_not_refresh_session_tokens():
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        if request.method == "GET":
+            return httpx.Response(
+                200, text='"MkEWBc":"rpc","FdrFJe":"sid","cfb2h":"bl"'
+            )
+        return httpx.Response(429)
+
+    governor = make_governor(failure_threshold=10, retries=2)
+
+    async def translate():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with patch("translate_handler.APIRequests", lambda: APIRequests(client)):
+                await TranslateHandler().get_translation_info(word="word", lang="de")
+
+    with patch("api_requests.session_tokens", TokenCache()), patch(
+        "api_requests.upstream_governor", governor
+    ), pytest.raises(UpstreamUnavailableError):
+        asyncio.run(translate())
+    assert seen == ["GET", "POST", "POST", "POST"]
+
+
+def test_blocked_responses_trip_the_breaker():
+    from api_requests import UpstreamBlockedError
+
+    responses = iter(
+        [httpx.Response(200, text="captcha")]
+        + [httpx.Response(302, headers={"location": "/sorry"})] * 2
+    )
+
+    def handler(request):
+        return next(responses)
+
+    governor = make_governor(failure_threshold=3)
+
+    async def translate():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            upstream = APIRequests(client)
+            with pytest.raises(UpstreamBlockedError):
+                await upstream.get_session_tokens()
+            tokens = api_requests.SessionTokens("rpc", "sid", "bl")
+            for _ in range(2):
+                with pytest.raises(UpstreamBlockedError):
+                    await upstream.fetch_translations(tokens, [("word", "de")])
+
+    with patch("api_requests.session_tokens", TokenCache()), patch(
+        "api_requests.upstream_governor", governor
+    ):
+        asyncio.run(translate())
+    assert governor.stats()["breaker"] == "open"
+    assert governor.limiter.limit < 4
+
+
+def test_rejected_session_tokens_do_not_trip_the_breaker():
+    governor = make_governor(failure_threshold=1)
+
+    async def translate():
+        async with httpx.AsyncClient(
+            transport=google_transport([], token_sids=("expired", "fresh"))
+        ) as client:
+            with patch("translate_handler.APIRequests", lambda: APIRequests(client)):
+                return await TranslateHandler().get_translation_info(
+                    word="w", lang="en"
+                )
+
+    with patch("api_requests.session_tokens", TokenCache()), patch(
+        "api_requests.upstream_governor", governor
+    ):
+        assert asyncio.run(translate()) == [None, None, "en"]
+    assert governor.stats()["breaker"] == "closed"
+    assert governor.stats()["errors"] == 1
+
+
+def test_create_word_fails_fast_when_circuit_open(test_client, db):
+    with patch.object(
+        TranslateHandler, "get_translation_info", side_effect=CircuitOpenError()
+    ):
+        response = test_client.post("/translate_word", json={"word": "x", "lang": "de"})
+    assert response.status_code == 503
+
+
+def test_metrics_endpoint_reports_requests_and_stages(test_client, db):
+    db.find_one.return_value = {"_id": "id", "name": "m", "lang": "de"}
+    test_client.post("/translate_word", json={"word": "m", "lang": "de"})
+    test_client.post("/translate_word", json={"word": "m", "lang": "de"})
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert (
+        'translator_http_requests_total{endpoint="create_word",method="POST",status="200"}'
+        in text
+    )
+    assert (
+        'translator_stage_duration_seconds_bucket{stage="mongo_find",le="+Inf"}' in text
+    )
+    assert 'translator_cache_lookups_total{cache="word",result="hit"}' in text
+    assert "# TYPE translator_http_request_duration_seconds histogram" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test", ["stage"], buckets=(0.1, 1))
+    metrics.registry.remove(histogram)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, 'a"b')
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+        'test_seconds_bucket{stage="a\\"b",le="1"} 2',
+        'test_seconds_bucket{stage="a\\"b",le="+Inf"} 3',
+        'test_seconds_sum{stage="a\\"b"} 5.55',
+        'test_seconds_count{stage="a\\"b"} 3',
+    ]
+
+
+def test_benchmark_suite_runs_against_fakes(monkeypatch):
+    import database
+    import main
+    from benchmarks import run as bench
+
+    # the module-scoped test client patches the collection factory
+    monkeypatch.setattr(main, "get_words_collection", database.get_words_collection)
+    monkeypatch.setattr(main, "client", main.client)
+    monkeypatch.setattr(main, "db", main.db)
+    monkeypatch.setattr(
+        main, "refresher", Refresher(api_requests.upstream_governor, 0, 0, 1)
+    )
+    monkeypatch.setattr(main, "warmup", WarmUp(preload=0))
+    monkeypatch.setattr(api_requests, "_client", None)
+    monkeypatch.setattr(api_requests.upstream_governor.bucket, "rate", 0)
+    api_requests.session_tokens.invalidate()
+    options = bench.parse_args(
+        [
+            "--requests",
+            "5",
+            "--concurrency",
+            "2",
+            "--google-latency",
+            "0",
+            "--page-size",
+            "1000",
+            "--skip-micro",
+        ]
+    )
+    try:
+        results = bench.run(options)
+    finally:
+        api_requests.session_tokens.invalidate()
+    scenarios = results["scenarios"]
+    assert scenarios["miss"]["statuses"] == {"201": 5}
+    assert scenarios["hit"]["statuses"] == {"200": 5}
+    assert scenarios["delete"]["statuses"] == {"204": 5}
+    assert scenarios["upstream"]["rpcs"] == 5
+    assert bench.compare(results, results)[0] == "miss.rps: %s -> %s (+0.0%%)" % (
+        scenarios["miss"]["rps"],
+        scenarios["miss"]["rps"],
+    )
+
+
+def test_dumps_encodes_mongo_documents(monkeypatch):
+    import serialization
+
+    document = {
+        "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718"),
+        "name": "вызов",
+        "lang": "ru",
+    }
+    expected = '{"_id":"64b7f0c2a1b2c3d4e5f60718","name":"вызов","lang":"ru"}'.encode()
+    assert serialization.dumps(document) == expected
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.dumps(document) == expected
+    word = TranslateHandler().build_word_model("test", "de", [])
+    document = serialization.word_document(word)
+    assert isinstance(document.pop("fetched_at"), datetime.datetime)
+    assert document == {
+        "_id": str(word.id),
+        "lang": "de",
+        "name": "test",
+        "definitions": [],
+        "synonyms": [],
+        "translations": [],
+        "examples": [],
+    }
+
+
+def test_snapshot_export_lookup_and_prefix_search(tmp_path):
+    from benchmarks.fake_mongo import FakeCollection
+    from snapshot import Snapshot, SnapshotError, export_snapshot
+
+    collection = FakeCollection("words")
+    for id_, name, lang in [
+        ("3", "apple", "de"),
+        ("1", "apply", "de"),
+        ("2", "apple", "fr"),
+        ("4", "ёж", "de"),
+    ]:
+        asyncio.run(
+            collection.insert_one(
+                {"_id": id_, "name": name, "lang": lang, "grams": ["app"]}
+            )
+        )
+    path = str(tmp_path / "words.snap")
+    assert asyncio.run(export_snapshot(collection, path)) == 4
+
+    snapshot = Snapshot(path)
+    assert json.loads(snapshot.get("apple", "fr")) == {
+        "_id": "2",
+        "name": "apple",
+        "lang": "fr",
+    }
+    assert json.loads(snapshot.get("ёж", "de"))["_id"] == "4"
+    assert snapshot.get("appl", "de") is None
+    bodies, cursor = snapshot.search("appl", limit=2)
+    assert [json.loads(body)["_id"] for body in bodies] == ["3", "2"]
+    assert cursor.startswith("snap:")
+    bodies, cursor = snapshot.search("appl", limit=2, after=cursor)
+    assert [json.loads(body)["_id"] for body in bodies] == ["1"] and cursor is None
+    with pytest.raises(ValueError):
+        snapshot.search("appl", limit=2, after="1")
+    other_worker = Snapshot(path)
+    assert snapshot.discard("apple")
+    assert not snapshot.discard("apple") and not snapshot.discard("appl")
+    assert snapshot.get("apple", "de") is None
+    assert [json.loads(body)["name"] for body in snapshot.search("a", limit=10)[0]] == [
+        "apply"
+    ]
+    # the tombstone is shared with the other workers serving the snapshot
+    assert other_worker.get("apple", "fr") is None
+    assert not other_worker.discard("apple")
+    other_worker.close()
+    snapshot.close()
+    assert Snapshot(path).get("apple", "de") is None
+
+    (tmp_path / "other").write_bytes(b"not a snapshot")
+    with pytest.raises(SnapshotError):
+        Snapshot(str(tmp_path / "other"))
+
+
+def test_endpoints_serve_from_snapshot(test_client, db, tmp_path, monkeypatch):
+    import main
+    from benchmarks.fake_mongo import FakeCollection
+    from snapshot import Snapshot, export_snapshot
+
+    collection = FakeCollection("words")
+    asyncio.run(collection.insert_one({"_id": "1", "name": "snap", "lang": "de"}))
+    asyncio.run(collection.insert_one({"_id": "2", "name": "snap", "lang": "fr"}))
+    path = str(tmp_path / "words.snap")
+    asyncio.run(export_snapshot(collection, path))
+    monkeypatch.setattr(main, "snapshot", Snapshot(path))
+
+    response = test_client.post("/translate_word", json={"word": "snap", "lang": "de"})
+    assert response.status_code == 200 and response.json()["_id"] == "1"
+    response = test_client.get("/sn?mode=prefix&limit=1")
+    assert response.json() == [{"_id": "1", "name": "snap", "lang": "de"}]
+    cursor = response.headers["X-Next-Cursor"]
+    response = test_client.get(f"/sn?mode=prefix&limit=1&after={cursor}")
+    assert response.json() == [{"_id": "2", "name": "snap", "lang": "fr"}]
+    assert "X-Next-Cursor" not in response.headers
+    assert test_client.get("/sn?mode=prefix&after=snap:zz").status_code == 400
+    db.find_one.assert_not_called()
+    db.find.assert_not_called()
+    # the word is only stored in the snapshot
+    with patch.object(db, "delete_one", return_value=MagicMock(deleted_count=0)):
+        assert test_client.delete("/snap").status_code == 204
+        assert main.snapshot.get("snap", "de") is None
+        assert test_client.delete("/snap").status_code == 404
+    main.snapshot.close()
+
+
+def test_logging_writes_json_records_with_request_id(tmp_path):
+    import logging
+    import log_config
+
+    path = tmp_path / "app.log"
+    root_level = logging.getLogger().level
+    try:
+        log_config.setup_logging(level="INFO", path=str(path))
+        token = log_config.request_id.set("abc")
+        logging.debug("skipped %s", "debug")
+        logging.info("created %s", "word")
+        log_config.request_id.reset(token)
+        logging.warning("no request")
+        log_config.stop_logging()
+    finally:
+        logging.getLogger().setLevel(root_level)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r["level"], r["message"], r.get("request_id")) for r in records] == [
+        ("INFO", "created word", "abc"),
+        ("WARNING", "no request", None),
+    ]
+
+
+def test_sampling_filter_keeps_info_records():
+    import logging
+    from log_config import SamplingFilter
+
+    sampling = SamplingFilter(0)
+    record = logging.makeLogRecord({"levelno": logging.DEBUG})
+    assert not sampling.filter(record)
+    assert sampling.filter(logging.makeLogRecord({"levelno": logging.INFO}))
+
+
+def test_request_id_is_echoed(test_client):
+    response = test_client.get("/admin/stats", headers={"X-Request-ID": "req-1"})
+    assert response.headers["x-request-id"] == "req-1"
+    assert len(test_client.get("/admin/stats").headers["x-request-id"]) == 32
+
+
+def test_create_word_languages_fans_out_in_one_batch(test_client, db):
+    stored = {"_id": "1", "name": "hello", "lang": "de", "translations": ["hallo"]}
+    translated = [
+        WordModel(
+            name="hello",
+            lang=lang,
+            translations=[text],
+            synonyms=[],
+            definitions=[],
+            examples=[],
+        )
+        for lang, text in [("fr", "bonjour"), ("es", "hola")]
+    ]
+    with patch.object(
+        db, "find", return_value=AsyncCursor([stored])
+    ) as find, patch.object(
+        TranslateHandler, "get_translation_objs", return_value=translated
+    ) as get_translation_objs:
+        response = test_client.post(
+            "/translate_languages",
+            json={"word": "hello", "langs": ["fr", "de", "qq", "es", "fr"]},
+        )
+    assert response.status_code == 200
+    results = response.json()
+    assert [(r["lang"], r["status_code"]) for r in results] == [
+        ("fr", 201),
+        ("de", 200),
+        ("qq", 404),
+        ("es", 201),
+        ("fr", 201),
+    ]
+    assert results[3]["translation"]["translations"] == ["hola"]
+    assert find.call_count == 1
+    get_translation_objs.assert_called_once_with([("hello", "fr"), ("hello", "es")])
+
+
+def test_fetch_translations_sends_source_language():
+    seen = []
+
+    async def translate():
+        async with httpx.AsyncClient(transport=google_transport(seen)) as client:
+            api_requests = APIRequests(client=client)
+            tokens = await api_requests.get_session_tokens()
+            return await api_requests.fetch_translations(
+                tokens, [("hallo", "en"), ("hallo", "fr")], source_lang="de"
+            )
+
+    with patch("api_requests.session_tokens", TokenCache()):
+        asyncio.run(translate())
+    payload = json.loads(
+        urllib.parse.unquote(seen[1].content.decode())[len("f.req=") : -1]
+    )
+    assert [json.loads(rpc[1])[0][:3] for rpc in payload[0]] == [
+        ["hallo", "de", "en"],
+        ["hallo", "de", "fr"],
+    ]
+
+
+def test_refresher_updates_stale_words_once():
+    from benchmarks.fake_mongo import FakeCollection
+
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=2)
+    collection = FakeCollection("words")
+    refreshed = []
+    governor = make_governor()
+    refresher = Refresher(
+        governor,
+        freshness=3600,
+        rate=0,
+        queue_size=10,
+        collection=collection,
+        on_refresh=lambda name, lang: refreshed.append((name, lang)),
+    )
+    word = WordModel(
+        name="old",
+        lang="de",
+        translations=["neu"],
+        synonyms=[],
+        definitions=[],
+        examples=[],
+    )
+    fetch = AsyncMock(return_value=word)
+
+    async def run():
+        await collection.insert_one(
+            {
+                "_id": "1",
+                "name": "old",
+                "lang": "de",
+                "translations": ["alt"],
+                "fetched_at": old,
+            }
+        )
+        refresher.start()
+        document = await collection.find_one({"name": "old"})
+        assert refresher.is_stale(document)
+        assert not refresher.is_stale({"fetched_at": datetime.datetime.utcnow()})
+        refresher.check(document)
+        refresher.check(document)
+        await refresher._queue.join()
+        await refresher.stop()
+        return await collection.find_one({"name": "old"})
+
+    with patch.object(TranslateHandler, "get_translation_obj", fetch):
+        document = asyncio.run(run())
+    fetch.assert_awaited_once_with(word="old", lang="de")
+    assert document["_id"] == "1" and document["translations"] == ["neu"]
+    assert document["fetched_at"] > old
+    assert refreshed == [("old", "de")]
+    assert refresher.stats()["refreshed"] == 1
+
+
+def test_write_behind_batches_and_drains():
+    from benchmarks.fake_mongo import FakeCollection
+    from write_behind import WriteBehind
+
+    collection = FakeCollection("words")
+    buffer = WriteBehind(
+        max_items=2, batch_size=2, flush_interval=60, collection=collection
+    )
+
+    async def run():
+        buffer.start()
+        await buffer.put({"_id": "1", "name": "one", "lang": "de"})
+        assert buffer.get("one", "de") == {"_id": "1", "name": "one", "lang": "de"}
+        await buffer.put({"_id": "2", "name": "two", "lang": "de"})
+        # the buffer is full: the third put waits for the batch of two to be flushed
+        await buffer.put({"_id": "3", "name": "three", "lang": "de"})
+        await buffer.put({"_id": "4", "name": "gone", "lang": "de"})
+        assert await buffer.discard("gone") == 1
+        await buffer.stop()
+        return await collection.find({}).to_list(None)
+
+    documents = asyncio.run(run())
+    assert sorted(document["name"] for document in documents) == ["one", "three", "two"]
+    assert documents[0]["grams"]
+    assert buffer.get("one", "de") is None
+    assert buffer.stats()["written"] == 3 and buffer.stats()["blocked"] >= 1
+
+
+def test_write_behind_retries_failed_inserts():
+    from benchmarks.fake_mongo import FakeCollection
+    from write_behind import WriteBehind
+
+    collection = FakeCollection("words")
+    buffer = WriteBehind(
+        max_items=10, batch_size=1, flush_interval=0, retries=2, collection=collection
+    )
+    insert_many = collection.insert_many
+    outcomes = iter(
+        [
+            ConnectionError("down"),
+            None,
+            ConnectionError("down"),
+            ConnectionError("down"),
+            ConnectionError("down"),
+        ]
+    )
+
+    async def flaky_insert_many(documents, **kwargs):
+        error = next(outcomes)
+        if error:
+            raise error
+        return await insert_many(documents, **kwargs)
+
+    async def run():
+        buffer.start()
+        await buffer.put({"_id": "1", "name": "one", "lang": "de"})
+        await buffer.put({"_id": "2", "name": "two", "lang": "de"})
+        await buffer.stop()
+        return await collection.find({}).to_list(None)
+
+    with patch.object(collection, "insert_many", flaky_insert_many):
+        documents = asyncio.run(run())
+    assert [document["name"] for document in documents] == ["one"]
+    assert buffer.stats()["written"] == 1 and buffer.stats()["failed"] == 1
+    assert buffer.stats()["retried"] == 3 and buffer.get("two", "de") is None
+
+
+def test_write_behind_discard_waits_for_running_flush():
+    from benchmarks.fake_mongo import FakeCollection
+    from write_behind import WriteBehind
+
+    collection = FakeCollection("words")
+    buffer = WriteBehind(
+        max_items=10, batch_size=1, flush_interval=0, collection=collection
+    )
+    insert_many = collection.insert_many
+    release = None
+
+    async def slow_insert_many(documents, **kwargs):
+        await release.wait()
+        return await insert_many(documents, **kwargs)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        buffer.start()
+        await buffer.put({"_id": "1", "name": "gone", "lang": "de"})
+        await asyncio.sleep(0.01)
+        discard = asyncio.create_task(buffer.discard("gone"))
+        await asyncio.sleep(0.01)
+        assert not discard.done()
+        release.set()
+        assert await discard == 1
+        await collection.delete_one({"name": "gone"})
+        await buffer.stop()
+        return await collection.find({}).to_list(None)
+
+    with patch.object(collection, "insert_many", slow_insert_many):
+        assert asyncio.run(run()) == []
+
+
+def test_create_word_defers_insert_to_write_behind(test_client, db, monkeypatch):
+    import main
+
+    buffer = MagicMock(enabled=True, put=AsyncMock())
+    buffer.get.return_value = None
+    monkeypatch.setattr(main, "write_behind", buffer)
+    word = WordModel(
+        name="later",
+        lang="de",
+        translations=["später"],
+        synonyms=[],
+        definitions=[],
+        examples=[],
+    )
+    with patch.object(TranslateHandler, "get_translation_obj", return_value=word):
+        response = test_client.post(
+            "/translate_word", json={"word": "later", "lang": "de"}
+        )
+    assert response.status_code == 201
+    assert buffer.put.call_args[0][0]["translations"] == ["später"]
+    db.find_one_and_update.assert_not_called()
+
+
+def test_ready_endpoint_reports_warm_up(test_client):
+    response = test_client.get("/admin/ready")
+    assert response.status_code == 200
+    assert set(response.json()["steps"]) == {"mongo", "preload"}
+
+
+def test_warm_up_preloads_words_and_survives_failures():
+    from benchmarks.fake_mongo import FakeCollection
+
+    collection = FakeCollection("words")
+    for day in range(3):
+        asyncio.run(
+            collection.insert_one(
+                {
+                    "_id": str(day),
+                    "name": f"w{day}",
+                    "lang": "de",
+                    "fetched_at": datetime.datetime(2024, 1, day + 1),
+                }
+            )
+        )
+    cache = WordCache(max_items=10, max_bytes=10000, ttl=60)
+    warmup = WarmUp(preload=2, session_tokens=True, timeout=1)
+    failing = AsyncMock(side_effect=UpstreamUnavailableError("down"))
+    with patch.object(APIRequests, "get_session_tokens", failing):
+        asyncio.run(warmup.run(collection, cache))
+    assert "error" in warmup.steps["session_tokens"]
+    assert warmup.steps["preload"]["count"] == 2
+    assert (
+        cache.get("w2", "de")
+        and cache.get("w1", "de")
+        and cache.get("w0", "de") is None
+    )
+
+
+def test_hit_counter_flushes_batched_increments():
+    from benchmarks.fake_mongo import FakeCollection
+    from popularity import HitCounter
+
+    collection = FakeCollection("words")
+    counter = HitCounter(flush_interval=60, max_keys=3, collection=collection)
+
+    async def run():
+        for id_, name, lang in [
+            ("1", "hot", "de"),
+            ("2", "hot", "fr"),
+            ("3", "cold", "de"),
+        ]:
+            await collection.insert_one({"_id": id_, "name": name, "lang": lang})
+        counter.start()
+        for _ in range(4):
+            counter.hit("hot", "de")
+        counter.hit("hot", "fr")
+        counter.hit("missing", "de")
+        # three distinct words trigger a flush before the interval
+        await asyncio.sleep(0.01)
+        assert counter.stats()["flushed"] == 3
+        counter.hit("cold", "de")
+        await counter.stop()
+        return await counter.top(2)
+
+    with patch.object(
+        collection, "bulk_write", wraps=collection.bulk_write
+    ) as bulk_write:
+        top = asyncio.run(run())
+    assert bulk_write.call_count == 2
+    assert top == [
+        {"name": "hot", "lang": "de", "hits": 4},
+        {"name": "hot", "lang": "fr", "hits": 1},
+    ]
+
+
+def test_top_words_endpoint(test_client, monkeypatch):
+    import main
+
+    top = AsyncMock(return_value=[{"name": "hot", "lang": "de", "hits": 4}])
+    monkeypatch.setattr(main.popularity, "top", top)
+    response = test_client.get("/admin/top_words?limit=5")
+    assert response.json() == [{"name": "hot", "lang": "de", "hits": 4}]
+    top.assert_awaited_once_with(5)
+
+
+def test_shared_cache_is_shared_between_workers(tmp_path):
+    from shared_cache import SharedWordCache
+
+    path = str(tmp_path / "cache")
+    first = SharedWordCache(path, slots=4, slot_size=128, ways=2, ttl=60)
+    second = SharedWordCache(path, slots=4, slot_size=128, ways=2, ttl=60)
+    first.set("word", "de", b'{"name":"word","lang":"de"}')
+    first.set("word", "fr", b'{"name":"word","lang":"fr"}')
+    assert second.get("word", "de") == b'{"name":"word","lang":"de"}'
+    second.set("word", "de", b"{}")
+    assert first.get("word", "de") == b"{}"
+    first.set("large", "de", b"x" * 200)
+    assert second.get("large", "de") is None
+
+    # a DELETE in one worker removes every language for all of them
+    second.invalidate("word")
+    assert first.get("word", "de") is None and first.get("word", "fr") is None
+
+    # a full set evicts its least recently used slot
+    names = [f"w{i}" for i in range(50)]
+    same_set = [
+        name for name in names if first._set_index(name) == first._set_index("w0")
+    ][:3]
+    first.set(same_set[0], "de", b"0")
+    first.set(same_set[1], "de", b"1")
+    first.get(same_set[0], "de")
+    first.set(same_set[2], "de", b"2")
+    assert second.get(same_set[1], "de") is None
+    assert (
+        second.get(same_set[0], "de") == b"0" and second.get(same_set[2], "de") == b"2"
+    )
+    assert first.evictions == 1
+    assert second.stats()["items"] == 2
+    first.close()
+    second.close()
+
+    expired = SharedWordCache(path, slots=4, slot_size=128, ways=2, ttl=0)
+    expired.set("word", "de", b"{}")
+    assert expired.get("word", "de") is None
+    expired.close()
+
+
+def test_shared_cache_layouts_do_not_resize_a_mapped_file(tmp_path):
+    from shared_cache import SharedCacheError, SharedWordCache
+
+    path = str(tmp_path / "cache")
+    old = SharedWordCache(path, slots=4, slot_size=128, ways=2, ttl=60)
+    old.set("word", "de", b"{}")
+    # a worker reloaded with another configuration opens its own file
+    new = SharedWordCache(path, slots=8, slot_size=256, ways=2, ttl=60)
+    assert new.path != old.path
+    assert new.get("word", "de") is None and old.get("word", "de") == b"{}"
+    new.close()
+
+    with open(old.path, "r+b") as f:
+        f.write(b"TRWC9999")
+    with pytest.raises(SharedCacheError):
+        SharedWordCache(path, slots=4, slot_size=128, ways=2, ttl=60)
+    old.close()
+
+
+def test_suggest_index_builds_and_tracks_words():
+    from benchmarks.fake_mongo import FakeCollection
+    from suggest import SuggestIndex
+
+    collection = FakeCollection("words")
+    index = SuggestIndex(sync_interval=0, rebuild_interval=0, collection=collection)
+
+    async def build():
+        for id_, name, lang in [
+            ("1", "cat", "de"),
+            ("2", "cat", "fr"),
+            ("3", "car", "de"),
+        ]:
+            await collection.insert_one({"_id": id_, "name": name, "lang": lang})
+        return await index.build()
+
+    assert asyncio.run(build()) == 2
+    index.add("cart", "fr")
+    index.add("dog", "de")
+    assert index.suggest("ca", 10) == ["car", "cart", "cat"]
+    assert index.suggest("ca", 2) == ["car", "cart"]
+    assert index.suggest("ca", 10, lang="fr") == ["cart", "cat"]
+    assert index.suggest("x", 10) == []
+
+    index.set_langs("cat", {"fr"})
+    assert index.suggest("cat", 10, lang="de") == []
+    index.set_langs("cat", set())
+    assert index.suggest("ca", 10) == ["car", "cart"]
+    assert len(index) == 3
+
+
+def test_suggest_index_keeps_changes_made_during_a_build():
+    from benchmarks.fake_mongo import FakeCollection
+    from suggest import SuggestIndex
+
+    collection = FakeCollection("words")
+    index = SuggestIndex(sync_interval=0, rebuild_interval=0, collection=collection)
+    find = collection.find
+
+    class SlowCursor:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        def sort(self, key):
+            self.cursor.sort(key)
+            return self
+
+        async def __aiter__(self):
+            async for document in self.cursor:
+                await asyncio.sleep(0)
+                yield document
+
+    collection.find = lambda *args: SlowCursor(find(*args))
+
+    async def run():
+        await collection.insert_one({"_id": "1", "name": "car", "lang": "de"})
+        await collection.insert_one({"_id": "2", "name": "cat", "lang": "de"})
+        build = asyncio.create_task(index.build())
+        await asyncio.sleep(0)
+        index.add("cab", "fr")
+        index.set_langs("cat", set())
+        await build
+
+    asyncio.run(run())
+    assert index.suggest("ca", 10) == ["cab", "car"]
+    assert index.suggest("ca", 10, lang="fr") == ["cab"]
+
+
+def test_suggest_index_syncs_words_stored_by_other_workers():
+    from benchmarks.fake_mongo import FakeCollection
+    from suggest import SuggestIndex
+
+    collection = FakeCollection("words")
+    index = SuggestIndex(sync_interval=0, rebuild_interval=0, collection=collection)
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+
+    async def run():
+        await collection.insert_one(
+            {"_id": "1", "name": "car", "lang": "de", "fetched_at": old}
+        )
+        await index.build()
+        await collection.insert_one(
+            {
+                "_id": "2",
+                "name": "cat",
+                "lang": "fr",
+                "fetched_at": datetime.datetime.utcnow(),
+            }
+        )
+        await collection.delete_one({"_id": "1"})
+        return await index.sync()
+
+    assert asyncio.run(run()) == 1
+    # deletes of other workers are only dropped by the next build
+    assert index.suggest("ca", 10) == ["car", "cat"]
+    assert index.suggest("ca", 10, lang="fr") == ["cat"]
+
+
+def test_suggest_endpoint(test_client, monkeypatch):
+    import main
+    from suggest import SuggestIndex
+
+    index = SuggestIndex(sync_interval=0, rebuild_interval=0)
+    index.add("cat", "de")
+    index.add("car", "fr")
+    monkeypatch.setattr(main, "suggest_index", index)
+    assert test_client.get("/suggest/ca").json() == ["car", "cat"]
+    assert test_client.get("/suggest/ca?lang=de&limit=1").json() == ["cat"]
+    assert test_client.get("/suggest/ca?limit=0").status_code == 422
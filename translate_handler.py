@@ -1,14 +1,37 @@
-from api_requests import APIRequests
+import asyncio
+import logging
+from typing import Any, List, Tuple, Union
+
+from api_requests import (
+    APIRequests,
+    MissingResultError,
+    UpstreamError,
+    UpstreamUnavailableError,
+)
+from governor import CircuitOpenError
+from metrics import STAGE_LATENCY
 from models import WordModel
+from settings import BATCH_MAX_RPCS
+from singleflight import SingleFlight
 from utils import get_nested_object
 
+# concurrent misses of the same (word, lang) share one upstream fetch
+translation_flights = SingleFlight()
+
+
+def tokens_rejected(error: BaseException) -> bool:
+    """Tells whether an upstream error may be cured by new session tokens"""
+    return isinstance(error, UpstreamError) and not isinstance(
+        error, (UpstreamUnavailableError, MissingResultError)
+    )
+
 
 class TranslateHandler:
     """
     Handler to translate a word in a given language.
     """
 
-    def get_translation_info(self, word: str, lang: str):
+    async def get_translation_info(self, word: str, lang: str):
         """
         Get the raw translation object from Google Translate API.
 
@@ -20,10 +43,89 @@ class TranslateHandler:
             The raw translation object as HTML string.
         """
         api_requests = APIRequests()
-        page = api_requests.get_google_translate_page(word=word, lang=lang)
-        return api_requests.fetch_translation(page=page, word=word, target_lang=lang)
+        tokens = await api_requests.get_session_tokens()
+        try:
+            return await api_requests.fetch_translation(
+                tokens=tokens, word=word, target_lang=lang
+            )
+        except UpstreamError as e:
+            if not tokens_rejected(e):
+                raise
+            logging.debug("Session tokens rejected while translating (%s)", word)
+            tokens = await api_requests.get_session_tokens(stale=tokens)
+            return await api_requests.fetch_translation(
+                tokens=tokens, word=word, target_lang=lang
+            )
+
+    async def get_translation_infos(
+        self, words: List[Tuple[str, str]], source_lang: str = "en"
+    ) -> List[Any]:
+        """
+        Get raw translation objects for several words, packing them into as
+        few batchexecute requests as possible.
+
+        Requests are sent concurrently; only the ones rejected for stale
+        session tokens are sent again, with new tokens.
 
-    def get_translation_obj(self, word: str, lang: str):
+        Args:
+            words: Pairs of word and language code to translate to.
+            source_lang: The language code of the words.
+
+        Returns:
+            Raw translation objects in the order of words. A word that could not
+            be translated gets the error instead: MissingResultError when Google
+            returned no result for it, the UpstreamError or CircuitOpenError of
+            its request otherwise.
+        """
+        api_requests = APIRequests()
+        chunks = [
+            words[i : i + BATCH_MAX_RPCS] for i in range(0, len(words), BATCH_MAX_RPCS)
+        ]
+        outcomes: List[Any] = [None] * len(chunks)
+        pending = list(range(len(chunks)))
+        tokens = None
+        for attempt in range(2):
+            try:
+                tokens = await api_requests.get_session_tokens(stale=tokens)
+            except (UpstreamError, CircuitOpenError) as e:
+                for index in pending:
+                    outcomes[index] = e
+                break
+            results = await asyncio.gather(
+                *(
+                    api_requests.fetch_translations(tokens, chunks[index], source_lang)
+                    for index in pending
+                ),
+                return_exceptions=True,
+            )
+            for index, result in zip(pending, results):
+                if isinstance(result, BaseException) and not isinstance(
+                    result, (UpstreamError, CircuitOpenError)
+                ):
+                    raise result
+                outcomes[index] = result
+            pending = [index for index in pending if tokens_rejected(outcomes[index])]
+            if not pending or attempt:
+                break
+            logging.debug(
+                "Session tokens rejected while translating %d words",
+                sum(len(chunks[index]) for index in pending),
+            )
+
+        raw_objects: List[Any] = []
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, BaseException):
+                raw_objects.extend(outcome for _ in chunk)
+                continue
+            raw_objects.extend(
+                MissingResultError(f"batchexecute returned no result for {word}")
+                if raw_object is None
+                else raw_object
+                for (word, _), raw_object in zip(chunk, outcome)
+            )
+        return raw_objects
+
+    async def get_translation_obj(self, word: str, lang: str):
         """
         Get the WordModel object with translated word information.
 
@@ -35,9 +137,51 @@ class TranslateHandler:
             The WordModel object with translations, synonyms, definitions, and examples. If translations, synonyms, definitions and examples are empty it means that there is something wrong with word
 
         """
-        raw_object = self.get_translation_info(word=word, lang=lang)
+
+        async def fetch():
+            raw_object = await self.get_translation_info(word=word, lang=lang)
+            with STAGE_LATENCY.time("parse"):
+                return self.build_word_model(word=word, lang=lang, raw_object=raw_object)
+
+        return await translation_flights.do((word, lang), fetch)
+
+    async def get_translation_objs(
+        self, words: List[Tuple[str, str]], source_lang: str = "en"
+    ) -> List[Union[WordModel, Exception]]:
+        """
+        Get WordModel objects for several words at once.
+
+        Args:
+            words: Pairs of word and language code to translate to.
+            source_lang: The language code of the words.
+
+        Returns:
+            The WordModel objects in the order of words. Empty objects mean that there is something wrong with the word, words that could not be translated get their error as in get_translation_infos.
+        """
+        raw_objects = await self.get_translation_infos(words, source_lang)
+        with STAGE_LATENCY.time("parse"):
+            return [
+                raw_object
+                if isinstance(raw_object, Exception)
+                else self.build_word_model(word=word, lang=lang, raw_object=raw_object)
+                for (word, lang), raw_object in zip(words, raw_objects)
+            ]
+
+    def build_word_model(self, word: str, lang: str, raw_object) -> WordModel:
+        """
+        Build the WordModel object from the raw translation object.
+
+        Args:
+            word: The translated word.
+            lang: The language code the word was translated to.
+            raw_object: The raw translation object.
+
+        Returns:
+            The WordModel object with translations, synonyms, definitions, and examples.
+        """
+        # fields are built here from parsed lists of strings, so validation is skipped
         if len(raw_object) < 4:
-            return WordModel(
+            return WordModel.construct(
                 name=word,
                 lang=lang,
                 translations=[],
@@ -50,7 +194,7 @@ class TranslateHandler:
         unique_synonyms = list(set(synonyms))
         definitions = self.set_definitions(raw_object)
         examples = self.set_examples(raw_object)
-        return WordModel(
+        return WordModel.construct(
             name=word,
             lang=lang,
             translations=translations,
@@ -1,7 +1,7 @@
 import re
 import random
 import functools
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, Optional
 
 
 def get_nested_object(o: dict, path: list) -> Optional[Any]:
@@ -21,6 +21,20 @@ def extract_value(string: str, pattern: str) -> Optional[str]:
     return None
 
 
+def extract_values(string: str, patterns: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Takes in a string and several patterns to search for within the string.
+    Scans the string once and returns a dictionary with the first value found
+    for every pattern. Patterns that are not found are mapped to None."""
+    values = dict.fromkeys(patterns)
+    regex = "|".join(re.escape(pattern) for pattern in values)
+    for match in re.finditer(f'"({regex})":"(.*?)"', string):
+        if values[match.group(1)] is None:
+            values[match.group(1)] = match.group(2)
+            if None not in values.values():
+                break
+    return values
+
+
 def generate_request_id():
     """Generate a random request ID"""
     return 1000 + int(random.randint(1, 100) * 9000)
@@ -0,0 +1,59 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from api_requests import APIRequests
+from cache import WordCache
+from database import POPULARITY_KEY, WORD_PROJECTION
+from serialization import dumps
+
+
+class WarmUp:
+    """
+    Startup work done before a worker takes traffic: a Mongo round trip to open
+    the pool, a session token fetch and preloading of the ``preload`` most
+    requested words into the word cache.
+
+    Every step is bounded by ``timeout`` seconds. A failing step is logged and
+    reported by ``stats`` but does not keep the worker from taking traffic,
+    requests then just pay for the cold path.
+    """
+
+    def __init__(self, preload: int, session_tokens: bool = True, timeout: float = 10):
+        self.preload = preload
+        self.session_tokens = session_tokens
+        self.timeout = timeout
+        self.steps: Dict[str, dict] = {}
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]]):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(fn(), self.timeout)
+            self.steps[name] = {"seconds": time.perf_counter() - started}
+            if isinstance(result, int):
+                self.steps[name]["count"] = result
+        except Exception as e:
+            self.steps[name] = {"seconds": time.perf_counter() - started, "error": repr(e)}
+            logging.warning("Warm-up step %s failed: %r", name, e)
+
+    async def load_words(self, collection, cache: WordCache) -> int:
+        """Puts the most requested stored words into the word cache"""
+        count = 0
+        words = collection.find({}, WORD_PROJECTION).sort(POPULARITY_KEY)
+        async for document in words.limit(self.preload):
+            cache.set(document["name"], document.get("lang"), dumps(document))
+            count += 1
+        return count
+
+    async def run(self, collection, cache: WordCache):
+        self.steps = {}
+        await self._step("mongo", lambda: collection.find_one({}, {"_id": 1}))
+        if self.session_tokens:
+            await self._step("session_tokens", lambda: APIRequests().get_session_tokens())
+        if self.preload > 0:
+            await self._step("preload", lambda: self.load_words(collection, cache))
+        logging.info("Warm-up finished: %s", self.steps)
+
+    def stats(self) -> dict:
+        return {"steps": self.steps}
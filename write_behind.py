@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from database import insert_words
+from metrics import STAGE_LATENCY
+from search import with_grams
+
+Key = Tuple[str, Optional[str]]
+
+
+class WriteBehind:
+    """
+    Buffers new word documents and inserts them into Mongo in the background.
+
+    Documents are flushed with one unordered insert_many once ``batch_size``
+    words are waiting or ``flush_interval`` seconds after the first one arrived.
+    When ``max_items`` words are waiting, ``put`` waits for the next flush.
+    A failed batch stays buffered and is written again up to ``retries`` times,
+    after a delay doubling from ``flush_interval``. Buffered documents can be
+    read with ``get`` until they are written, their search index field is
+    added on write.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        batch_size: int,
+        flush_interval: float,
+        retries: int = 5,
+        collection=None,
+    ):
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.collection = collection
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[Key, Dict[str, Any]] = {}
+        self._attempts: Dict[Key, int] = {}
+        self._in_flight: Set[Key] = set()
+        self._flushed: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.flushes = 0
+        self.blocked = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._queue is not None
+
+    def get(self, name: str, lang: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Returns the buffered document of the word or None"""
+        return self._pending.get((name, lang))
+
+    async def put(self, document: Dict[str, Any]) -> None:
+        """Buffers a document, waiting while the buffer is full"""
+        key = (document["name"], document["lang"])
+        if key in self._pending:
+            return
+        self._pending[key] = document
+        if self._queue.full():
+            self.blocked += 1
+        await self._queue.put(key)
+
+    async def discard(self, name: str) -> int:
+        """
+        Drops the buffered documents of a deleted word in every language.
+
+        Waits for a flush that is writing one of them, so deleting the word
+        from Mongo afterwards also removes what that flush wrote.
+
+        Returns:
+            The number of dropped documents.
+        """
+        keys = [key for key in self._pending if key[0] == name]
+        if self._flushed is not None:
+            async with self._flushed:
+                await self._flushed.wait_for(
+                    lambda: not any(key[0] == name for key in self._in_flight)
+                )
+        for key in keys:
+            self._pending.pop(key, None)
+            self._attempts.pop(key, None)
+        return len(keys)
+
+    async def flush(self, keys: List[Key]) -> List[Key]:
+        """
+        Writes the buffered documents of the keys.
+
+        Returns:
+            The keys to write again because the insert failed.
+        """
+        documents = [self._pending[key] for key in keys if key in self._pending]
+        if not documents:
+            return []
+        self.flushes += 1
+        self._in_flight.update(keys)
+        try:
+            return await self._write(keys, documents)
+        finally:
+            self._in_flight.difference_update(keys)
+            if self._flushed is not None:
+                async with self._flushed:
+                    self._flushed.notify_all()
+
+    async def _write(self, keys: List[Key], documents: List[Dict[str, Any]]) -> List[Key]:
+        try:
+            with STAGE_LATENCY.time("mongo_flush"):
+                await insert_words(
+                    self.collection, [with_grams(document) for document in documents]
+                )
+        except Exception as e:
+            retry = []
+            for key in keys:
+                if key not in self._pending:
+                    continue
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                if self._attempts[key] > self.retries:
+                    self.failed += 1
+                    self._pending.pop(key)
+                    self._attempts.pop(key)
+                else:
+                    retry.append(key)
+            self.retried += len(retry)
+            logging.warning(
+                "Failed to write %d buffered words, %d dropped after %d retries: %s",
+                len(documents),
+                len(documents) - len(retry),
+                self.retries,
+                e,
+            )
+            return retry
+        self.written += len(documents)
+        for key in keys:
+            self._pending.pop(key, None)
+            self._attempts.pop(key, None)
+        return []
+
+    async def run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        retry: List[Key] = []
+        while True:
+            if retry:
+                attempts = max(self._attempts.get(key, 1) for key in retry)
+                await asyncio.sleep(self.flush_interval * 2 ** (attempts - 1))
+                keys, retry = retry, []
+            else:
+                keys = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(keys) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    keys.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                retry = await self.flush(keys)
+            finally:
+                # retried keys stay unfinished, so stop() waits for them
+                for _ in range(len(keys) - len(retry)):
+                    queue.task_done()
+
+    def start(self):
+        self._flushed = asyncio.Condition()
+        self._queue = asyncio.Queue(maxsize=self.max_items)
+        self._task = asyncio.create_task(self.run(self._queue))
+
+    async def stop(self):
+        """Writes the buffered documents and stops the background task"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+        self._flushed = None
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._pending),
+            "written": self.written,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flushes": self.flushes,
+            "blocked": self.blocked,
+        }